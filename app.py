@@ -1,14 +1,11 @@
 import streamlit as st
-import google.generativeai as genai
 import hashlib
-import requests
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import A4
-from io import BytesIO
 import json
 import os
-from google.api_core.exceptions import ResourceExhausted
+import time
+from concurrent.futures import ThreadPoolExecutor
+from user_store import SQLiteUserStore
+from passwords import hash_password, needs_rehash, verify_password
 
 # ────────────────────────────────────────────────
 #  Page config & DARK aesthetic styling
@@ -22,13 +19,8 @@ st.set_page_config(
 
 st.markdown("""
     <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-
-    * { font-family: 'Inter', sans-serif; }
-
     .stApp {
-        background: linear-gradient(rgba(15,17,23,0.78), rgba(15,17,23,0.88)),
-                    url('https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=2400&q=80') center/cover fixed !important;
+        background: linear-gradient(rgb(15,17,23), rgb(22,27,38)) fixed !important;
         color: #e2e8f0 !important;
     }
 
@@ -81,30 +73,15 @@ st.markdown("""
 # ────────────────────────────────────────────────
 #  User management (multi-user support)
 # ────────────────────────────────────────────────
-USERS_FILE = "users.json"
-
-def load_users():
-    try:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, "r") as f:
-                return json.load(f)
-        else:
-            default = {"teacher": hashlib.sha256("curriculum2025".encode()).hexdigest()}
-            with open(USERS_FILE, "w") as f:
-                json.dump(default, f, indent=4)
-            return default
-    except Exception as e:
-        st.error(f"Error loading users: {e}")
-        return {}
-
-def save_users(users):
-    try:
-        with open(USERS_FILE, "w") as f:
-            json.dump(users, f, indent=4)
-    except Exception as e:
-        st.error(f"Error saving users: {e}")
+@st.cache_resource
+def get_user_store():
+    return SQLiteUserStore()
 
-users = load_users()
+try:
+    users = get_user_store()
+except Exception as e:
+    st.error(f"Error loading users: {e}")
+    st.stop()
 
 # ────────────────────────────────────────────────
 #  Login / Register
@@ -123,7 +100,10 @@ if not st.session_state.logged_in:
             username = st.text_input("Username")
             password = st.text_input("Password", type="password")
             if st.form_submit_button("Login", use_container_width=True, type="primary"):
-                if username in users and users[username] == hashlib.sha256(password.encode()).hexdigest():
+                stored = users.get_hash(username)
+                if verify_password(password, stored):
+                    if needs_rehash(stored):
+                        users.set_hash(username, hash_password(password))
                     st.session_state.logged_in = True
                     st.session_state.username = username
                     st.success("Logged in!")
@@ -143,9 +123,9 @@ if not st.session_state.logged_in:
                     st.error("Username taken")
                 elif not new_username or not new_password:
                     st.error("Fields cannot be empty")
+                elif not users.add_user(new_username, hash_password(new_password)):
+                    st.error("Username taken")
                 else:
-                    users[new_username] = hashlib.sha256(new_password.encode()).hexdigest()
-                    save_users(users)
                     st.session_state.logged_in = True
                     st.session_state.username = new_username
                     st.success("Registered & logged in!")
@@ -154,6 +134,38 @@ if not st.session_state.logged_in:
     st.caption("Demo: teacher / curriculum2025")
     st.stop()
 
+# ────────────────────────────────────────────────
+#  Signed-in app: heavy modules load only past the login screen
+# ────────────────────────────────────────────────
+import google.generativeai as genai
+from response_cache import ResponseCache, make_key
+from gemini_client import GeminiClient
+from scheduler import PRIORITY_GENERATION, PRIORITY_INTERACTIVE, PRIORITY_NOTEBOOK, Scheduler
+from chat_context import ChatContext, DEFAULT_BUDGET, STRATEGIES
+from pdf_export import PdfCache, content_hash
+from curriculum import build_prompt, generate_curriculum, semester_number
+from jobs import JobQueue, JobStore, is_active
+from storage import WorkspaceStore
+from render import (cache_stats as render_cache_stats, collapsed_block, format_markdown, prepare_markdown,
+                    split_transcript)
+from telemetry import admin_users, shared_telemetry, start_exporter
+from retrieval import (EMBED_DIM, EMBED_MODEL, NEAR_DUPLICATE, SEED_MIN, GeminiEmbedder, RetrievalIndex,
+                       compact_seed, spec_query)
+
+# The photo backdrop and web font are fetched by the browser, so keep them off the login screen
+st.markdown("""
+    <style>
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
+
+    * { font-family: 'Inter', sans-serif; }
+
+    .stApp {
+        background: linear-gradient(rgba(15,17,23,0.78), rgba(15,17,23,0.88)),
+                    url('https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=1600&q=70&fm=webp') center/cover fixed !important;
+    }
+    </style>
+""", unsafe_allow_html=True)
+
 # ────────────────────────────────────────────────
 #  Logout
 # ────────────────────────────────────────────────
@@ -176,8 +188,237 @@ if not GEMINI_API_KEY:
     st.warning("Enter your Gemini API key → https://aistudio.google.com/app/apikey")
     st.stop()
 
+# The SDK keeps one global key, so it is set on every rerun in case another user's key was set last
 genai.configure(api_key=GEMINI_API_KEY)
 
+@st.cache_resource
+def get_telemetry():
+    telemetry = shared_telemetry()
+    port = os.environ.get("CURRICUFORGE_METRICS_PORT")
+    if port:
+        start_exporter(telemetry, int(port))
+    return telemetry
+
+telemetry = get_telemetry()
+
+@st.cache_resource
+def get_client(api_key: str):
+    return GeminiClient(api_key, telemetry=telemetry)
+
+client = get_client(GEMINI_API_KEY)
+
+@st.cache_resource
+def get_scheduler():
+    return Scheduler()
+
+scheduler = get_scheduler()
+username = st.session_state.get("username", "anonymous")
+
+# ────────────────────────────────────────────────
+#  Background jobs
+# ────────────────────────────────────────────────
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(JobStore())
+
+jobs = get_job_queue()
+
+# Kinds whose result the page shows; a new session (refresh, reconnect) re-attaches any still running
+ATTACHED_KINDS = ("chat", "curriculum", "summary", "section", "similar")
+
+if "pending_jobs" not in st.session_state:
+    st.session_state.pending_jobs = {
+        job["id"]: job["kind"] for job in jobs.store.recent(username, limit=20)
+        if job["kind"] in ATTACHED_KINDS and is_active(job)
+    }
+if "job_errors" not in st.session_state:
+    st.session_state.job_errors = {}
+
+# ────────────────────────────────────────────────
+#  Persistent workspace (conversations, notes, curricula)
+# ────────────────────────────────────────────────
+@st.cache_resource
+def get_workspace():
+    return WorkspaceStore()
+
+workspace = get_workspace()
+
+CHAT_WINDOW = 20
+CHAT_PAGE = 20
+GREETING = ("Hello! 👋 I'm **Curriculum Designer**.\n\nWhat curriculum would you like to create?\n"
+            "• Subject / Topic?\n• Grade / Age?\n• Duration?\n• Goals?\n• Special needs?\n\nReady! 🚀")
+
+def open_conversation(conversation_id):
+    st.session_state.conversation_id = conversation_id
+    st.session_state.messages = workspace.load_messages(conversation_id, limit=CHAT_WINDOW)
+    st.session_state.chat_window = CHAT_WINDOW
+    st.session_state.pop("chat_context", None)
+    st.session_state.pop("chat_matches", None)
+
+def start_conversation():
+    conversation_id = workspace.create_conversation(username)
+    workspace.append_message(conversation_id, "model", GREETING)
+    open_conversation(conversation_id)
+
+def show_message(msg):
+    st.session_state.messages.append(msg)
+    # Older turns stay in the database; only the visible window is kept in memory
+    del st.session_state.messages[:-st.session_state.chat_window]
+
+def add_message(role, content, **meta):
+    seq = workspace.append_message(st.session_state.conversation_id, role, content, meta)
+    show_message({"role": role, "parts": [content], "seq": seq, **meta})
+    return seq
+
+if "conversation_id" not in st.session_state:
+    recent = workspace.list_conversations(username, limit=1)
+    if recent:
+        open_conversation(recent[0]["id"])
+    else:
+        start_conversation()
+
+NOTEBOOK_TEMPLATE = "# My Curriculum Notes\n\nStart writing..."
+
+if "notebook_content" not in st.session_state:
+    st.session_state.notebook_content = workspace.load_notebook(username) or NOTEBOOK_TEMPLATE
+    st.session_state.notebook_saved = st.session_state.notebook_content
+
+# ────────────────────────────────────────────────
+#  Semantic retrieval (saved curricula + notebook sections)
+# ────────────────────────────────────────────────
+@st.cache_resource
+def get_retrieval_index():
+    return RetrievalIndex(embedder_name=f"{EMBED_MODEL}/{EMBED_DIM}")
+
+@st.cache_resource
+def get_embedder(api_key: str):
+    return GeminiEmbedder(get_client(api_key))
+
+retrieval = get_retrieval_index()
+embedder = get_embedder(GEMINI_API_KEY)
+
+# Lookups embed text and may grow the index, so they only ever run on job workers, never on a rerun
+
+def user_embedder(user):
+    # Embedding calls count against the user's quota like any other call
+    return embedder.using(scheduler.bind(client, user, PRIORITY_NOTEBOOK))
+
+def find_similar(query, user, kind=None, k=3, min_score=0.0, sync=True):
+    """Nearest saved programs / notes for ``user``. ``sync=False`` only embeds the query (chat turns)."""
+    embed = user_embedder(user)
+    if sync:
+        # Picks up programs saved since the last lookup, by any user or worker
+        retrieval.sync_curricula(workspace, embed)
+    return retrieval.search(query, embed, k=k, kind=kind, user=user, min_score=min_score)
+
+def index_curricula(curriculum_id, user=None):
+    def run_index(job, user=user or username):
+        return {"added": retrieval.sync_curricula(workspace, user_embedder(user))}
+
+    # Fire and forget, like notebook indexing: a program missing from the index is only a missed match
+    jobs.submit("index_curricula", user or username, {"curriculum": curriculum_id}, run_index)
+
+@st.cache_resource
+def get_lookup_pool():
+    # Chat lookups run beside the model call, not on the job worker that streams the reply
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="lookup")
+
+lookup_pool = get_lookup_pool()
+
+def index_notebook(content):
+    def run_index(job, content=content, user=username):
+        return {"added": retrieval.sync_notebook(user, content, user_embedder(user))}
+
+    # Fire and forget: a failed index run only means fewer note matches
+    jobs.submit("index_notebook", username,
+                {"user": username, "content": hashlib.sha256(content.encode()).hexdigest()}, run_index)
+
+QUOTA_ERRORS = ("ResourceExhausted", "QueueTimeout")
+CHAT_QUOTA_HELP = ("**Quota limit reached** (429 error).\n\n"
+                   "Free tier is usually ~20 requests/day for gemini-2.5-flash.\n"
+                   "Solutions:\n"
+                   "• Wait until tomorrow (quota reset)\n"
+                   "• Create new API key in new project: https://aistudio.google.com/app/apikey\n"
+                   "• Try gemini-2.5-flash-lite (often higher limit)\n"
+                   "• Add billing for much higher limits (cheap)")
+
+def show_appended_notes(added):
+    """A worker already appended ``added`` to the stored notebook; show it without losing an unsaved edit."""
+    edited = st.session_state.get("notebook_editor")
+    if edited is not None and edited != st.session_state.get("notebook_saved"):
+        content = edited + added
+        workspace.save_notebook(username, content)
+    else:
+        content = workspace.load_notebook(username) or added
+    st.session_state.notebook_content = st.session_state.notebook_saved = content
+    # Drop the editor's widget state so it re-reads notebook_content; this runs before it is created
+    st.session_state.pop("notebook_editor", None)
+    index_notebook(content)
+
+def apply_job(job):
+    result = job["result"]
+    if job["kind"] == "chat":
+        # The worker already stored the reply; only show it if that conversation is still open
+        if result["conversation_id"] == st.session_state.conversation_id:
+            show_message({"role": "model", "parts": [result["text"]], "seq": result["seq"], **result["meta"]})
+            st.session_state.chat_matches = result["matches"]
+        st.session_state.setdefault("chat_timings", []).append({"ttft": result["meta"]["ttft"],
+                                                                "latency": result["meta"]["latency"]})
+    elif job["kind"] == "curriculum":
+        st.session_state.curriculum = result["curriculum"]
+        if job["user"] != username:
+            # Collapsed onto another user's identical job, which saved it under their name
+            index_curricula(workspace.save_curriculum(username, result["curriculum"], job["params"]))
+    elif job["kind"] in ("summary", "section"):
+        if job["user"] != username:
+            # Collapsed onto another user's identical job, which wrote to their notebook
+            workspace.append_notebook(username, result["added"], NOTEBOOK_TEMPLATE)
+        show_appended_notes(result["added"])
+    elif job["kind"] == "similar":
+        st.session_state.similar = result
+
+# Fold in anything that finished since the last rerun
+for job_id, kind in list(st.session_state.pending_jobs.items()):
+    job = jobs.store.get(job_id)
+    if is_active(job):
+        continue
+    del st.session_state.pending_jobs[job_id]
+    if job is not None and job["status"] == "done":
+        apply_job(job)
+    else:
+        st.session_state.job_errors[kind] = job or {"error": "Job lost", "error_type": None}
+        if kind == "chat":
+            # A failed turn can leave the live session unusable; the next turn reseeds it from the database
+            st.session_state.pop("chat_context", None)
+
+def pending_job(kind):
+    return next((j for j, k in st.session_state.pending_jobs.items() if k == kind), None)
+
+def submit_job(kind, params, fn, user=None):
+    job_id = jobs.submit(kind, user or username, params, fn)
+    st.session_state.pending_jobs[job_id] = kind
+    return job_id
+
+def job_finished(job_id):
+    return not is_active(jobs.store.get(job_id))
+
+def show_job_error(kind, default_prefix, quota_message):
+    job = st.session_state.job_errors.pop(kind, None)
+    if job is not None:
+        if job.get("error_type") in QUOTA_ERRORS:
+            st.error(quota_message)
+        else:
+            st.error(f"{default_prefix}: {job.get('error')}")
+
+# ────────────────────────────────────────────────
+#  Response cache (shared across users & restarts)
+# ────────────────────────────────────────────────
+QUICK_MODEL = "gemini-2.5-flash"
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
 # ────────────────────────────────────────────────
 #  System Prompt
 # ────────────────────────────────────────────────
@@ -222,72 +463,166 @@ with st.sidebar:
         "gemini-2.5-pro"
     ]
     selected_model = st.selectbox("Model", model_options, index=0)
+    stream_responses = st.toggle("Stream responses", value=True)
+
+    timings = st.session_state.get("chat_timings", [])
+    if timings:
+        avg_ttft = sum(t["ttft"] for t in timings) / len(timings)
+        avg_total = sum(t["latency"] for t in timings) / len(timings)
+        st.caption(f"Avg first token {avg_ttft:.2f}s • avg response {avg_total:.2f}s ({len(timings)} turns)")
+
+    with st.expander("Context budget"):
+        context_budget = st.number_input("Max context tokens", 2000, 200000, DEFAULT_BUDGET, step=1000)
+        context_strategy = st.selectbox("When over budget", STRATEGIES, format_func=lambda s: {
+            "summarize": "Summarize older turns",
+            "drop": "Drop older turns"
+        }[s])
+        if "chat_context" in st.session_state:
+            ctx = st.session_state.chat_context
+            st.caption(f"Context: ~{ctx.context_tokens} / {context_budget} tokens • "
+                       f"{ctx.compactions} compactions")
 
     if st.button("🧹 New Conversation", use_container_width=True):
-        for key in ["messages", "notebook_content", "curriculum"]:
-            if key in st.session_state:
-                del st.session_state[key]
+        st.session_state.pop("curriculum", None)
+        start_conversation()
         st.rerun()
 
+    conversations = workspace.list_conversations(username, limit=20)
+    conversation_ids = [c["id"] for c in conversations]
+    if st.session_state.conversation_id in conversation_ids:
+        chosen = st.selectbox(
+            "💬 Conversations", conversation_ids,
+            index=conversation_ids.index(st.session_state.conversation_id),
+            format_func=lambda cid: next(c["title"] for c in conversations if c["id"] == cid)
+        )
+        if chosen != st.session_state.conversation_id:
+            open_conversation(chosen)
+            st.rerun()
+
+    with st.expander("📚 My curricula"):
+        limit = st.session_state.get("curricula_limit", 5)
+        saved = workspace.list_curricula(username, limit=limit + 1)
+        for item in saved[:limit]:
+            if st.button(item["program_title"] or "Untitled program", key=f"curriculum_{item['id']}",
+                         use_container_width=True):
+                st.session_state.curriculum = workspace.load_curriculum(item["id"])
+                st.rerun()
+        if len(saved) > limit and st.button("Show more", key="curricula_more"):
+            st.session_state.curricula_limit = limit + 5
+            st.rerun()
+        if not saved:
+            st.caption("Generated programs will appear here.")
+
     if st.button("🚪 Logout", use_container_width=True):
         logout()
 
     st.markdown("---")
     st.subheader("📝 Notebook")
 
-    if "notebook_content" not in st.session_state:
-        st.session_state.notebook_content = "# My Curriculum Notes\n\nStart writing..."
-
     st.session_state.notebook_content = st.text_area(
         "Notes",
         value=st.session_state.notebook_content,
         height=300,
         key="notebook_editor"
     )
+    if st.session_state.notebook_content != st.session_state.get("notebook_saved"):
+        workspace.save_notebook(username, st.session_state.notebook_content)
+        st.session_state.notebook_saved = st.session_state.notebook_content
+        index_notebook(st.session_state.notebook_content)
 
     col1, col2 = st.columns(2)
     with col1:
-        if st.button("✨ Summarize Chat"):
+        if st.button("✨ Summarize Chat", disabled=pending_job("summary") is not None):
             if st.session_state.get("messages"):
-                with st.spinner("Summarizing..."):
-                    summary_text = "\n".join(
-                        f"**{m['role']}**: {m.get('parts', [m.get('content', '')])[0][:250]}..."
-                        for m in st.session_state.messages[-10:]
+                summary_text = "\n".join(
+                    f"**{m['role']}**: {m.get('parts', [m.get('content', '')])[0][:250]}..."
+                    for m in st.session_state.messages[-10:]
+                )
+                notes_api = scheduler.bind(client, username, PRIORITY_NOTEBOOK)
+
+                def run_summary(job, text=summary_text, api=notes_api, user=username):
+                    resp = api.generate_content(
+                        "gemini-2.5-flash-lite",
+                        f"Summarize this curriculum discussion concisely in markdown:\n\n{text}"
                     )
-                    try:
-                        model_sum = genai.GenerativeModel("gemini-2.5-flash-lite")
-                        resp = model_sum.generate_content(
-                            f"Summarize this curriculum discussion concisely in markdown:\n\n{summary_text}"
-                        )
-                        st.session_state.notebook_content += f"\n\n## Chat Summary\n{resp.text}"
-                        st.rerun()
-                    except ResourceExhausted:
-                        st.error("Quota limit reached. Try again later or use a different key.")
-                    except Exception as e:
-                        st.error(f"Summary failed: {e}")
+                    # Written from the worker so the summary lands even if the page was closed
+                    added = f"\n\n## Chat Summary\n{resp.text}"
+                    workspace.append_notebook(user, added, NOTEBOOK_TEMPLATE)
+                    return {"text": resp.text, "added": added}
+
+                submit_job("summary", {"text": summary_text}, run_summary)
             else:
                 st.info("No chat history to summarize.")
+        if pending_job("summary"):
+            st.caption("⏳ Summarizing...")
+        show_job_error("summary", "Summary failed", "Quota limit reached. Try again later or use a different key.")
 
     with col2:
         if st.button("➕ Add Section"):
             topic = st.text_input("Topic to expand", key="expand_topic_temp")
             if topic and st.button("Generate", key="gen_expand"):
-                with st.spinner("Generating..."):
-                    last = ""
-                    if st.session_state.get("messages"):
-                        last_msg = st.session_state.messages[-1]
-                        last = last_msg.get("parts", [last_msg.get("content", "")])[0][:400]
-                    try:
-                        model_add = genai.GenerativeModel("gemini-2.5-flash-lite")
-                        resp = model_add.generate_content(
-                            f"Create clean markdown notes on: '{topic}'\nContext: {last}"
-                        )
-                        st.session_state.notebook_content += f"\n\n## {topic}\n{resp.text}"
-                        st.rerun()
-                    except ResourceExhausted:
-                        st.error("Quota limit reached. Try again later.")
-                    except Exception as e:
-                        st.error(f"Generation failed: {e}")
+                last = ""
+                if st.session_state.get("messages"):
+                    last_msg = st.session_state.messages[-1]
+                    last = last_msg.get("parts", [last_msg.get("content", "")])[0][:400]
+                notes_api = scheduler.bind(client, username, PRIORITY_NOTEBOOK)
+
+                def run_section(job, topic=topic, last=last, api=notes_api, user=username):
+                    resp = api.generate_content(
+                        "gemini-2.5-flash-lite",
+                        f"Create clean markdown notes on: '{topic}'\nContext: {last}"
+                    )
+                    added = f"\n\n## {topic}\n{resp.text}"
+                    workspace.append_notebook(user, added, NOTEBOOK_TEMPLATE)
+                    return {"topic": topic, "text": resp.text, "added": added}
+
+                submit_job("section", {"topic": topic, "context": last}, run_section)
+        if pending_job("section"):
+            st.caption("⏳ Writing section...")
+        show_job_error("section", "Generation failed", "Quota limit reached. Try again later.")
+
+    @st.fragment(run_every=1)
+    def watch_notebook_jobs():
+        # Pull finished notebook jobs into the page without waiting for the next interaction
+        for kind in ("summary", "section"):
+            job_id = pending_job(kind)
+            if job_id and job_finished(job_id):
+                st.rerun()
+
+    if pending_job("summary") or pending_job("section"):
+        watch_notebook_jobs()
+
+    with st.expander("🗂 Background jobs"):
+        for job in jobs.store.recent(username, limit=8):
+            age = int(time.time() - job["created_at"])
+            st.caption(f"{job['kind']} • {job['status']} • {age}s ago")
+            if job["status"] == "done" and job["kind"] == "curriculum":
+                if st.button("Load", key=f"load_{job['id']}"):
+                    st.session_state.curriculum = job["result"]["curriculum"]
+                    st.rerun()
+
+    cache_stats = get_response_cache().stats()
+    st.caption(f"Curriculum cache: {cache_stats['hits']} hits • {cache_stats['misses']} misses • "
+               f"{cache_stats['entries']} stored")
+    api_stats = client.metrics()
+    st.caption(f"API: {api_stats['in_flight']} in flight • {api_stats['retries']} retries • "
+               f"p50 {api_stats['p50']:.2f}s • p95 {api_stats['p95']:.2f}s")
+    sched_stats = scheduler.stats(username)
+    budgets = " • ".join(
+        f"{m.replace('gemini-2.5-', '')} {s['remaining']}{' ⏸' if s['cooling'] else ''}"
+        for m, s in sched_stats["models"].items()
+    )
+    st.caption(f"Queue: {sched_stats['queue_depth']} waiting • {sched_stats['fallbacks']} fallbacks • "
+               f"your budget {sched_stats['user_remaining']}/min")
+    st.caption(f"Model budget/min: {budgets}")
+    if username in admin_users():
+        st.page_link("pages/admin_metrics.py", label="Admin metrics", icon="📈")
+    render_times = st.session_state.get("render_times")
+    if render_times:
+        render_stats = render_cache_stats()
+        st.caption(f"Transcript render: last {render_times[-1] * 1000:.0f} ms • "
+                   f"avg {sum(render_times) / len(render_times) * 1000:.0f} ms • "
+                   f"{render_stats['hits']} cache hits")
 
     st.download_button(
         "Download Notes (.md)",
@@ -300,27 +635,73 @@ with st.sidebar:
 # ────────────────────────────────────────────────
 #  Model & Chat Setup
 # ────────────────────────────────────────────────
-@st.cache_resource
-def get_model(model_name: str):
-    return genai.GenerativeModel(
-        model_name=model_name,
-        system_instruction=SYSTEM_PROMPT
-    )
-
-model = get_model(selected_model)
+model = client.model(selected_model, system_instruction=SYSTEM_PROMPT)
+
+def format_timing(ttft, latency, tokens=None, used_model=None, requested_model=None):
+    text = f"⏱ first token {ttft:.2f}s • total {latency:.2f}s"
+    if tokens:
+        text += f" • 🔢 {tokens['prompt']} in / {tokens['output']} out"
+    if used_model and used_model != requested_model:
+        text += f" • ↪ answered by {used_model} (quota fallback)"
+    return text
+
+if st.session_state.messages and st.session_state.messages[0]["seq"] > 1:
+    if st.button("⬆ Load older messages"):
+        older = workspace.load_messages(st.session_state.conversation_id,
+                                        before_seq=st.session_state.messages[0]["seq"], limit=CHAT_PAGE)
+        st.session_state.messages[:0] = older
+        st.session_state.chat_window += len(older)
+        st.rerun()
 
-if "messages" not in st.session_state:
-    st.session_state.messages = [{
-        "role": "model",
-        "parts": ["Hello! 👋 I'm **Curriculum Designer**.\n\nWhat curriculum would you like to create?\n"
-                  "• Subject / Topic?\n• Grade / Age?\n• Duration?\n• Goals?\n• Special needs?\n\nReady! 🚀"]
-    }]
+render_start = time.perf_counter()
+older_messages, recent_messages = split_transcript(st.session_state.messages)
+if older_messages:
+    # One markdown element for the whole backlog keeps reruns from re-sending every bubble
+    with st.expander(f"Earlier messages ({len(older_messages)})"):
+        st.markdown(collapsed_block(older_messages, {"user": "You", "model": "Curriculum Designer"}))
 
-for msg in st.session_state.messages:
+for msg in recent_messages:
     role = "assistant" if msg["role"] == "model" else "user"
     with st.chat_message(role):
         content = msg["parts"][0] if "parts" in msg else msg.get("content", "")
-        st.markdown(content)
+        st.markdown(prepare_markdown(content))
+        if "latency" in msg:
+            st.caption(format_timing(msg["ttft"], msg["latency"], msg.get("tokens"),
+                                     msg.get("model"), msg.get("requested_model")))
+render_times = st.session_state.setdefault("render_times", [])
+render_times.append(time.perf_counter() - render_start)
+del render_times[:-20]
+
+@st.fragment(run_every=0.5)
+def show_chat_progress(job_id):
+    job = jobs.store.get(job_id)
+    if not is_active(job):
+        st.rerun()
+    with st.chat_message("assistant"):
+        text = (job["progress"] or {}).get("text")
+        if text:
+            # Partial text changes every poll, so format it without filling the cache
+            st.markdown(format_markdown(text) + "▌")
+        else:
+            st.markdown("_Thinking..._")
+
+if st.session_state.get("chat_matches"):
+    with st.expander(f"📎 Related saved work ({len(st.session_state.chat_matches)})"):
+        for match in st.session_state.chat_matches:
+            col_m1, col_m2 = st.columns([5, 1])
+            label = "Program" if match["kind"] == "curriculum" else "Note"
+            col_m1.markdown(f"**{label}: {match['title']}** · {match['score']:.0%} similar")
+            if match["kind"] == "curriculum":
+                if col_m2.button("Load", key=f"chat_reuse_{match['ref']}"):
+                    st.session_state.curriculum = workspace.load_curriculum(match["ref"])
+                    st.rerun()
+            else:
+                col_m1.caption(match["snippet"])
+
+chat_job = pending_job("chat")
+if chat_job:
+    show_chat_progress(chat_job)
+show_job_error("chat", "Error", CHAT_QUOTA_HELP)
 
 # ────────────────────────────────────────────────
 #  Quick Curriculum Generator
@@ -336,59 +717,132 @@ with col1:
 with col2:
     weekly_hours = st.slider("Weekly Hours", 10, 40, 20)
     industry = st.text_input("Industry Focus", "AI & Data Science")
+    generation_mode = st.radio("Generation mode", ["Single response", "Parallel per semester"], horizontal=True,
+                               help="Parallel mode plans the program first, then writes every semester at once.")
+    force_fresh = st.checkbox("Skip cache (force fresh generation)", value=False)
+
+def render_semester(sem):
+    with st.expander(f"Semester {sem.get('semester')}"):
+        for course in sem.get("courses", []):
+            st.subheader(course.get("course_name", "Course"))
+            st.write("Credits:", course.get("credits", "—"))
+            st.markdown("**Topics:**")
+            for t in course.get("topics", []):
+                st.write(f"- {t}")
+            st.markdown("**Learning Outcomes:**")
+            for o in course.get("learning_outcomes", []):
+                st.write(f"- {o}")
+            st.markdown("---")
+
+spec = {
+    "skill": skill,
+    "level": level,
+    "semesters": semesters,
+    "weekly_hours": weekly_hours,
+    "industry": industry
+}
+
+query = spec_query(spec)
+similar_found = st.session_state.get("similar")
+# Results only count for the spec they were searched with; editing a field hides them
+similar = similar_found["matches"] if similar_found and similar_found["query"] == query else []
+similar_job = pending_job("similar")
+if st.button("🔎 Find similar saved programs", disabled=similar_job is not None):
+    def run_similar(job, query=query, user=username):
+        return {"query": query, "matches": find_similar(query, user, kind="curriculum")}
+
+    similar_job = submit_job("similar", {"query": query, "user": username}, run_similar)
+
+@st.fragment(run_every=0.5)
+def watch_similar_job(job_id):
+    if job_finished(job_id):
+        st.rerun()
+    st.caption("🔎 Looking for similar saved programs...")
+
+if similar_job:
+    watch_similar_job(similar_job)
+elif similar_found and similar_found["query"] == query and not similar:
+    st.caption("No similar saved programs yet.")
+show_job_error("similar", "Search failed", "Quota limit reached. Try again later.")
+
+near_duplicates = [m for m in similar if m["score"] >= NEAR_DUPLICATE]
+if near_duplicates:
+    with st.expander(f"♻️ {len(near_duplicates)} saved program(s) already match this — reuse instead of generating",
+                     expanded=True):
+        for match in near_duplicates:
+            col_m1, col_m2 = st.columns([5, 1])
+            col_m1.markdown(f"**{match['title']}** · {match['score']:.0%} similar")
+            if col_m2.button("Load", key=f"reuse_{match['ref']}"):
+                st.session_state.curriculum = workspace.load_curriculum(match["ref"])
+                telemetry.cache_hit(QUICK_MODEL, user=username)
+                st.rerun()
+
+seed_match = similar[0] if similar and similar[0]["score"] >= SEED_MIN else None
+use_seed = seed_match is not None and st.checkbox(
+    f"Start from “{seed_match['title']}” ({seed_match['score']:.0%} similar)",
+    help="Passes that program's outline to the model as a starting point."
+)
 
 if st.button("Generate Quick Curriculum"):
     if not GEMINI_API_KEY:
         st.error("Enter API key first.")
     else:
-        prompt = f"""
-Generate structured curriculum in pure JSON.
-
-Skill: {skill}
-Level: {level}
-Semesters: {semesters}
-Weekly Hours: {weekly_hours}
-Focus: {industry}
-
-Return ONLY valid JSON:
-
-{{
-  "program_title": "",
-  "semesters": [
-    {{
-      "semester": 1,
-      "courses": [
-        {{
-          "course_name": "",
-          "credits": "",
-          "topics": [""],
-          "learning_outcomes": [""]
-        }}
-      ]
-    }}
-  ]
-}}
-"""
-
-        with st.spinner("Generating..."):
-            try:
-                url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
-                payload = {
-                    "contents": [{"parts": [{"text": prompt}]}]
-                }
-                resp = requests.post(url, json=payload, headers={"Content-Type": "application/json"})
-                result = resp.json()
-
-                if "error" in result:
-                    st.error(f"API Error: {result['error']['message']}")
-                else:
-                    text = result["candidates"][0]["content"]["parts"][0]["text"]
-                    text = text.replace("```json", "").replace("```", "").strip()
-                    curriculum = json.loads(text)
-                    st.session_state.curriculum = curriculum
-                    st.success("Generated!")
-            except Exception as e:
-                st.error(f"Failed: {str(e)}")
+        seed_data = workspace.load_curriculum(seed_match["ref"]) if use_seed else None
+        seed = compact_seed(seed_data) if seed_data else None
+        prompt = build_prompt(**spec, seed=seed)
+
+        cache = get_response_cache()
+        cache_key = make_key(QUICK_MODEL, prompt)
+        cached_text = None if force_fresh else cache.get(cache_key)
+
+        if cached_text is not None:
+            st.session_state.curriculum = json.loads(cached_text)
+            index_curricula(workspace.save_curriculum(username, st.session_state.curriculum, spec))
+            telemetry.cache_hit(QUICK_MODEL, user=username)
+            st.success("Loaded from cache!")
+        else:
+            parallel = generation_mode == "Parallel per semester"
+            quick_api = scheduler.bind(client, username, PRIORITY_GENERATION)
+
+            def run_curriculum(job, spec=spec, parallel=parallel, stream=stream_responses, api=quick_api,
+                               cache=cache, cache_key=cache_key, user=username, seed=seed):
+                done = []
+
+                def on_semester(sem):
+                    done.append(sem)
+                    job.progress({"semesters": done}, force=True)
+
+                curriculum, complete = generate_curriculum(api, QUICK_MODEL, spec, parallel, stream, on_semester,
+                                                           seed=seed)
+                # Only cache a complete program, so a malformed response is never replayed, and only one
+                # written entirely by QUICK_MODEL, so quota fallback output is never served under its key
+                if complete and api.models_used == {QUICK_MODEL}:
+                    cache.set(cache_key, QUICK_MODEL, json.dumps(curriculum))
+                index_curricula(workspace.save_curriculum(user, curriculum, spec), user)
+                return {"curriculum": curriculum, "complete": complete}
+
+            # Identical specs from any user share one in-flight job
+            submit_job("curriculum", {**spec, "parallel": parallel, "stream": stream_responses,
+                                      "fresh": force_fresh, "seed": seed_match["ref"] if seed else None},
+                       run_curriculum)
+
+@st.fragment(run_every=0.5)
+def show_curriculum_progress(job_id):
+    job = jobs.store.get(job_id)
+    if not is_active(job):
+        st.rerun()
+    st.info("⏳ Generating curriculum in the background — you can keep working.")
+    for sem in sorted((job["progress"] or {}).get("semesters", []), key=semester_number):
+        render_semester(sem)
+
+curriculum_job = pending_job("curriculum")
+if curriculum_job:
+    show_curriculum_progress(curriculum_job)
+show_job_error("curriculum", "Failed", "Quota limit reached. Try again later or switch models.")
+
+@st.cache_resource
+def get_pdf_cache():
+    return PdfCache()
 
 # Display curriculum
 if "curriculum" in st.session_state and st.session_state.curriculum:
@@ -396,83 +850,124 @@ if "curriculum" in st.session_state and st.session_state.curriculum:
     st.header(curriculum.get("program_title", "Generated Curriculum"))
 
     for sem in curriculum.get("semesters", []):
-        with st.expander(f"Semester {sem.get('semester')}"):
-            for course in sem.get("courses", []):
-                st.subheader(course.get("course_name", "Course"))
-                st.write("Credits:", course.get("credits", "—"))
-                st.markdown("**Topics:**")
-                for t in course.get("topics", []):
-                    st.write(f"- {t}")
-                st.markdown("**Learning Outcomes:**")
-                for o in course.get("learning_outcomes", []):
-                    st.write(f"- {o}")
-                st.markdown("---")
-
-    def generate_pdf(data):
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
-        elements = []
-        elements.append(Paragraph(data.get("program_title", ""), styles["Title"]))
-        elements.append(Spacer(1, 12))
-
-        for sem in data.get("semesters", []):
-            elements.append(Paragraph(f"Semester {sem.get('semester')}", styles["Heading2"]))
-            elements.append(Spacer(1, 10))
-            for course in sem.get("courses", []):
-                elements.append(Paragraph(course.get("course_name", ""), styles["Heading3"]))
-                elements.append(Paragraph(f"Credits: {course.get('credits', '')}", styles["Normal"]))
-                elements.append(Spacer(1, 5))
-                elements.append(Paragraph("Topics:", styles["Normal"]))
-                for t in course.get("topics", []):
-                    elements.append(Paragraph(f"- {t}", styles["Normal"]))
-                elements.append(Spacer(1, 5))
-                elements.append(Paragraph("Learning Outcomes:", styles["Normal"]))
-                for o in course.get("learning_outcomes", []):
-                    elements.append(Paragraph(f"- {o}", styles["Normal"]))
-                elements.append(Spacer(1, 15))
-
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
-
-    pdf = generate_pdf(curriculum)
+        render_semester(sem)
 
     col_d1, col_d2 = st.columns(2)
     with col_d1:
-        st.download_button("Download PDF", pdf, "curriculum.pdf", "application/pdf", use_container_width=True)
+        # Build the PDF only on request; reruns afterwards are a hash lookup
+        pdf_key = content_hash(curriculum)
+        pdf = get_pdf_cache().peek(pdf_key)
+        if pdf is None:
+            if st.button("Prepare PDF", use_container_width=True):
+                with st.spinner("Building PDF..."):
+                    pdf = get_pdf_cache().get_or_build(curriculum, pdf_key)
+        if pdf is not None:
+            st.download_button("Download PDF", pdf, "curriculum.pdf", "application/pdf", use_container_width=True)
     with col_d2:
         st.download_button("Download JSON", json.dumps(curriculum, indent=2), "curriculum.json", "application/json", use_container_width=True)
 
 # ────────────────────────────────────────────────
 #  Chat Input
 # ────────────────────────────────────────────────
-if prompt := st.chat_input("Describe the curriculum you need..."):
-    st.session_state.messages.append({"role": "user", "parts": [prompt]})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
+LOOKUP_WAIT = 5  # seconds a finished reply waits for its related-work lookup before showing without it
+
+def run_chat_turn(job, ctx, prompt, model_name, user, stream, conversation_id, reference=None):
+    start = time.perf_counter()
+    ttft = None
+
+    # Saved programs and notes this request resembles are looked up beside the model call, so they never
+    # delay the first token; they are shown under the reply and may ground a later turn.
+    lookup = lookup_pool.submit(find_similar, prompt, user, min_score=SEED_MIN, sync=False)
+
+    # A program picked from an earlier turn's matches grounds this one turn only
+    seed_data = workspace.load_curriculum(reference) if reference else None
+    sent = prompt
+    if seed_data:
+        sent += f"\n\n(For reference, a similar program we already designed:\n{compact_seed(seed_data)})"
+
+    if stream:
+        response, used_model = scheduler.run(
+            user, model_name,
+            lambda m: ctx.send(client, sent, model_name=m, stream=True),
+            PRIORITY_INTERACTIVE
+        )
+        full_text = ""
+        for chunk in response:
             try:
-                history = []
-                for m in st.session_state.messages[:-1]:
-                    role = "model" if m["role"] == "model" else "user"
-                    content = m["parts"][0] if "parts" in m else m.get("content", "")
-                    history.append({"role": role, "parts": [content]})
-
-                chat = model.start_chat(history=history)
-                response = chat.send_message(prompt)
-                full_text = response.text
-                st.markdown(full_text)
-                st.session_state.messages.append({"role": "model", "parts": [full_text]})
-            except ResourceExhausted:
-                st.error("**Quota limit reached** (429 error).\n\n"
-                         "Free tier is usually ~20 requests/day for gemini-2.5-flash.\n"
-                         "Solutions:\n"
-                         "• Wait until tomorrow (quota reset)\n"
-                         "• Create new API key in new project: https://aistudio.google.com/app/apikey\n"
-                         "• Try gemini-2.5-flash-lite (often higher limit)\n"
-                         "• Add billing for much higher limits (cheap)")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
\ No newline at end of file
+                piece = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) carry nothing to render
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            full_text += piece
+            job.progress({"text": full_text})
+    else:
+        response, used_model = scheduler.run(
+            user, model_name,
+            lambda m: ctx.send(client, sent, model_name=m),
+            PRIORITY_INTERACTIVE
+        )
+        full_text = response.text
+
+    latency = time.perf_counter() - start
+    if ttft is None:
+        ttft = latency
+    if ctx.broken():
+        raise RuntimeError("The reply was cut off or blocked before it finished. Please try again.")
+    tokens = ctx.record(response, sent, full_text)
+    meta = {
+        "ttft": ttft,
+        "latency": latency,
+        "tokens": tokens,
+        "model": used_model,
+        "requested_model": model_name
+    }
+    if seed_data:
+        # The outline is not kept in the session, so later turns do not re-send it
+        ctx.replace_last_prompt(prompt, sent)
+        meta["reference"] = reference
+    # Persist from the worker so the reply survives a refresh or disconnect
+    seq = workspace.append_message(conversation_id, "model", full_text, meta)
+    if ctx.over_budget():
+        # Its own job, so the reply is not held back for the summary call and a failed summary costs
+        # nothing but a retry on the next turn (the failed call is still traced in telemetry)
+        jobs.submit("compact", user, {"conversation": conversation_id, "turn": seq},
+                    lambda job, ctx=ctx, api=scheduler.bind(client, user, PRIORITY_NOTEBOOK):
+                        {"compacted": ctx.compact(api)})
+    # Retrieval is only a shortcut, so a failed or slow lookup just means no matches
+    try:
+        matches = lookup.result(timeout=LOOKUP_WAIT)
+    except Exception:
+        matches = []
+    return {"text": full_text, "meta": meta, "conversation_id": conversation_id, "seq": seq, "matches": matches}
+
+if prompt := st.chat_input("Describe the curriculum you need...", disabled=chat_job is not None):
+    conversation_id = st.session_state.conversation_id
+    if add_message("user", prompt) == 2:
+        # First user turn after the greeting names the conversation
+        workspace.rename_conversation(conversation_id, prompt[:60])
+
+    ctx = st.session_state.get("chat_context")
+    if ctx is None or ctx.model_name != selected_model:
+        # First turn, or the model changed: seed a fresh session from the stored transcript once
+        ctx = ChatContext.from_messages(model, selected_model, workspace.load_messages(conversation_id)[:-1],
+                                        system_instruction=SYSTEM_PROMPT)
+        st.session_state.chat_context = ctx
+    ctx.budget = context_budget
+    ctx.strategy = context_strategy
+    # The closest program found on the previous turn grounds this one, once per conversation
+    program_matches = [m for m in st.session_state.pop("chat_matches", None) or [] if m["kind"] == "curriculum"]
+    reference = program_matches[0]["ref"] if program_matches and not ctx.reference_used else None
+    if reference:
+        ctx.reference_used = True
+
+    submit_job(
+        "chat",
+        {"conversation": conversation_id, "prompt": prompt, "model": selected_model,
+         "turn": st.session_state.messages[-1]["seq"], "reference": reference},
+        lambda job, ctx=ctx, prompt=prompt, model_name=selected_model, user=username, stream=stream_responses,
+               conversation_id=conversation_id, reference=reference:
+            run_chat_turn(job, ctx, prompt, model_name, user, stream, conversation_id, reference)
+    )
+    st.rerun()
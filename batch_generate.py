@@ -0,0 +1,242 @@
+"""Generate many Quick Curricula headlessly from a CSV or JSONL file of program specs.
+
+Each row needs skill, level, semesters, weekly_hours and industry. Results land in the output directory as
+one JSON and one PDF per program; progress is checkpointed there, so re-running the same command resumes
+after a crash or a batch of failures. Programs that failed, or still failed validation after repair
+("incomplete"), are re-run with --retry-failed.
+
+Usage:
+    GEMINI_API_KEY=... python batch_generate.py programs.csv --out batch_output --workers 4 --rpm 10
+    python batch_generate.py programs.jsonl --out batch_output --no-pdf --retry-failed
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from curriculum import build_prompt, generate_curriculum
+from gemini_client import API_BASE, GeminiClient
+from pdf_export import generate_pdf
+from response_cache import ResponseCache, make_key
+from scheduler import MODEL_LIMITS, PRIORITY_BATCH, Scheduler
+from telemetry import Telemetry, percentile
+
+# ────────────────────────────────────────────────
+#  Batch settings
+# ────────────────────────────────────────────────
+BATCH_MODEL = "gemini-2.5-flash"
+BATCH_USER = "batch"
+CHECKPOINT_FILE = "checkpoint.jsonl"
+SPEC_FIELDS = ("skill", "level", "semesters", "weekly_hours", "industry")
+INT_FIELDS = ("semesters", "weekly_hours")
+
+
+# ────────────────────────────────────────────────
+#  Input
+# ────────────────────────────────────────────────
+def read_specs(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize_spec(row):
+    """Coerce one input row into the keyword arguments of ``build_prompt``; raises ValueError if unusable."""
+    missing = [name for name in SPEC_FIELDS if str(row.get(name) or "").strip() == ""]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    spec = {name: str(row[name]).strip() for name in SPEC_FIELDS}
+    for name in INT_FIELDS:
+        try:
+            spec[name] = int(spec[name])
+        except ValueError:
+            raise ValueError(f"{name} must be a whole number, got {spec[name]!r}")
+    return spec
+
+
+def output_name(spec, key):
+    slug = re.sub(r"[^a-z0-9]+", "-", f"{spec['skill']} {spec['level']}".lower()).strip("-")
+    return f"{slug[:60]}-{key[:8]}"
+
+
+# ────────────────────────────────────────────────
+#  Checkpoint
+# ────────────────────────────────────────────────
+class Checkpoint:
+    """Append-only log of finished programs; the last line for a key wins."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self.entries[entry["key"]] = entry
+        self._lock = threading.Lock()
+
+    def status(self, key):
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        # Older checkpoints logged invalid programs as done with complete=False
+        return "incomplete" if entry["status"] == "done" and entry.get("complete") is False else entry["status"]
+
+    def record(self, key, **fields):
+        entry = {"key": key, **fields, "at": time.time()}
+        with self._lock:
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+# ────────────────────────────────────────────────
+#  Generation
+# ────────────────────────────────────────────────
+def generate_one(api, cache, telemetry, spec, key, out_dir, model_name, parallel, write_pdf, fresh):
+    """Generate (or load from cache) one program and write its files; returns a checkpoint entry."""
+    start = time.perf_counter()
+    cached_text = None if fresh else cache.get(key)
+    if cached_text is not None:
+        curriculum, complete = json.loads(cached_text), True
+        telemetry.cache_hit(model_name, user=BATCH_USER)
+    else:
+        curriculum, complete = generate_curriculum(api, model_name, spec, parallel=parallel, stream=False)
+        if complete and api.models_used == {model_name}:
+            cache.set(key, model_name, json.dumps(curriculum))
+
+    base = os.path.join(out_dir, output_name(spec, key))
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"spec": spec, "curriculum": curriculum}, f, indent=2)
+    files = [base + ".json"]
+    if write_pdf:
+        with open(base + ".pdf", "wb") as f:
+            f.write(generate_pdf(curriculum))
+        files.append(base + ".pdf")
+
+    return {
+        "status": "done" if complete else "incomplete",
+        "files": [os.path.basename(p) for p in files],
+        "cached": cached_text is not None,
+        "complete": complete,
+        "model": ", ".join(sorted(api.models_used)) if cached_text is None else model_name,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV or JSONL file of program specs")
+    parser.add_argument("--out", default="batch_output", help="directory for JSON, PDFs and the checkpoint")
+    parser.add_argument("--model", default=BATCH_MODEL)
+    parser.add_argument("--workers", type=int, default=4, help="programs generated concurrently")
+    parser.add_argument("--rpm", type=int, default=10, help="requests per minute allowed for the batch and --model")
+    parser.add_argument("--max-wait", type=float, default=600, help="seconds a request may queue for quota")
+    parser.add_argument("--parallel", action="store_true", help="fan out one request per semester")
+    parser.add_argument("--no-pdf", action="store_true", help="write curriculum JSON only")
+    parser.add_argument("--fresh", action="store_true", help="ignore the shared response cache")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="also re-run programs that failed or came back incomplete last time")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument("--base-url", default=API_BASE, help="Gemini REST endpoint (e.g. a local fake server)")
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("set GEMINI_API_KEY or pass --api-key")
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(args.out, CHECKPOINT_FILE))
+
+    # The same key the app's Quick generator uses, so batch and interactive runs share cached programs
+    todo, invalid, skipped, seen = [], 0, 0, set()
+    for line, row in enumerate(read_specs(args.input), start=1):
+        try:
+            spec = normalize_spec(row)
+        except ValueError as e:
+            print(f"  row {line}: skipped ({e})", file=sys.stderr)
+            invalid += 1
+            continue
+        key = make_key(args.model, build_prompt(**spec))
+        status = checkpoint.status(key)
+        if key in seen or status == "done" or (status in ("failed", "incomplete") and not args.retry_failed):
+            skipped += 1
+            continue
+        seen.add(key)
+        todo.append((spec, key))
+
+    print(f"{len(todo)} to generate, {skipped} already in checkpoint, {invalid} invalid rows")
+    if not todo:
+        return
+
+    # Batch calls land in the same telemetry store as the app's, attributed to the batch user
+    telemetry = Telemetry()
+    client = GeminiClient(args.api_key, max_concurrency=args.workers * 2, base_url=args.base_url,
+                          telemetry=telemetry)
+    # --rpm is the batch's quota for --model too; the free-tier default would push it onto fallback models
+    scheduler = Scheduler(model_limits={**MODEL_LIMITS, args.model: args.rpm}, user_rpm=args.rpm,
+                          max_wait=args.max_wait)
+    cache = ResponseCache()
+
+    results = []
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        # One bound client per program, so each one's last_model reports its own fallback
+        futures = {
+            pool.submit(generate_one, scheduler.bind(client, BATCH_USER, PRIORITY_BATCH), cache, telemetry, spec,
+                        key, args.out, args.model, args.parallel, not args.no_pdf, args.fresh): (spec, key)
+            for spec, key in todo
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            spec, key = futures[future]
+            label = f"{spec['skill']} ({spec['level']})"
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {"status": "failed", "error": str(e), "error_type": type(e).__name__}
+                print(f"  [{i}/{len(todo)}] FAILED {label}: {type(e).__name__}: {e}")
+            else:
+                note = "cache" if entry["cached"] else f"{entry['seconds']:.1f}s"
+                if not entry["complete"]:
+                    note += ", incomplete"
+                print(f"  [{i}/{len(todo)}] {label} → {entry['files'][0]} ({note})")
+            checkpoint.record(key, spec=spec, **entry)
+            results.append(entry)
+    wall = time.perf_counter() - wall_start
+
+    done = [r for r in results if r["status"] != "failed"]
+    incomplete = [r for r in results if r["status"] == "incomplete"]
+    failed = [r for r in results if r["status"] == "failed"]
+    generated = [r["seconds"] for r in done if not r["cached"]]
+    errors = {}
+    for r in failed:
+        errors[r["error_type"]] = errors.get(r["error_type"], 0) + 1
+    metrics = client.metrics()
+    sched = scheduler.stats(BATCH_USER)
+
+    print(f"\nDone {len(done)}/{len(results)} in {wall:.1f}s — {len(done) / wall * 60:.1f} programs/min")
+    print(f"Generated {len(generated)} • from cache {len(done) - len(generated)} • "
+          f"incomplete {len(incomplete)} • failed {len(failed)}")
+    if generated:
+        print(f"Per program: p50 {percentile(generated, 50):.1f}s • p95 {percentile(generated, 95):.1f}s")
+    print(f"API: {metrics['calls']} calls • {metrics['retries']} retries • {metrics['errors']} errors • "
+          f"{sched['fallbacks']} model fallbacks • {sched['timeouts']} quota timeouts")
+    if errors:
+        print("Failures: " + ", ".join(f"{name} ×{count}" for name, count in sorted(errors.items())))
+    if failed or incomplete:
+        print("Re-run with --retry-failed to try them again.")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Login latency / throughput for each password-hashing cost setting.
+
+Usage:
+    python benchmarks/bench_passwords.py --logins 50 --workers 4 --budget-ms 250
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import calibrate_scrypt, hash_password, verify_password  # noqa: E402
+from telemetry import percentile  # noqa: E402
+
+SETTINGS = [
+    ("scrypt", {"n": 2 ** 12, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 13, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 14, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 15, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 16, "r": 8, "p": 1}),
+    ("pbkdf2_sha256", {"iterations": 210_000}),
+    ("pbkdf2_sha256", {"iterations": 600_000}),
+]
+
+
+def bench(scheme, params, logins, workers):
+    stored = hash_password("correct horse battery staple", scheme, **params)
+
+    def login(_):
+        start = time.perf_counter()
+        assert verify_password("correct horse battery staple", stored)
+        return (time.perf_counter() - start) * 1000
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(login, range(logins)))
+    wall = time.perf_counter() - wall_start
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "throughput": logins / wall
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=30, help="logins per setting")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="concurrent logins")
+    parser.add_argument("--budget-ms", type=float, default=250, help="per-login latency budget")
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins per setting, {args.workers} concurrent, budget {args.budget_ms:.0f} ms\n")
+    print(f"{'setting':<34}{'p50 ms':>10}{'p95 ms':>10}{'logins/s':>11}  budget")
+    for scheme, params in SETTINGS:
+        result = bench(scheme, params, args.logins, args.workers)
+        label = f"{scheme} " + " ".join(f"{k}={v}" for k, v in params.items())
+        verdict = "ok" if result["p95"] <= args.budget_ms else "over"
+        print(f"{label:<34}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['throughput']:>11.1f}  {verdict}")
+
+    print(f"\nCalibrated scrypt n for a single login under {args.budget_ms:.0f} ms: "
+          f"{calibrate_scrypt(args.budget_ms)}")
+    print("Set CURRICUFORGE_SCRYPT_N to the chosen value before starting the app.")
+
+
+if __name__ == "__main__":
+    main()
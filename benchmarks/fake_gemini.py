@@ -0,0 +1,225 @@
+"""Local stand-in for the Gemini generateContent / streamGenerateContent REST API.
+
+Usage:
+    python benchmarks/fake_gemini.py --port 8765 --latency-ms 800 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 300      # delay before the first byte
+    chunk_chars: int = 200       # characters of text per streamed chunk
+    chunk_delay_ms: float = 30   # delay between streamed chunks
+    error_rate: float = 0.0      # fraction of requests answered with 429
+    invalid_rate: float = 0.0    # fraction of generated courses missing their learning outcomes
+    retry_after: float = 0.0     # Retry-After header on injected 429s
+    courses: int = 4             # courses per semester in curriculum JSON
+    reply_chars: int = 3000      # length of free-text (chat / notes) replies
+
+
+# ────────────────────────────────────────────────
+#  Canned responses
+# ────────────────────────────────────────────────
+def _course(sem, i):
+    return {
+        "course_name": f"Course {sem}.{i}",
+        "credits": "4",
+        "topics": [f"Topic {sem}.{i}.{t}" for t in range(1, 7)],
+        "learning_outcomes": [f"Outcome {sem}.{i}.{o}" for o in range(1, 5)]
+    }
+
+
+def _semester(n, courses, invalid_rate=0.0):
+    generated = [_course(n, i) for i in range(1, courses + 1)]
+    for course in generated:
+        if random.random() < invalid_rate:
+            del course["learning_outcomes"]
+    return {"semester": n, "courses": generated}
+
+
+def _reply_text(prompt, config):
+    match = re.search(r"Semesters: (\d+)", prompt)
+    semesters = int(match.group(1)) if match else 4
+    if match := re.search(r"Fix one course from semester (\d+) of", prompt):
+        doc = _course(int(match.group(1)), 0)
+    elif "Plan the outline" in prompt:
+        doc = {
+            "program_title": "Fake Program",
+            "semesters": [
+                {"semester": n, "theme": f"Theme {n}",
+                 "course_names": [f"Course {n}.{i}" for i in range(1, config.courses + 1)]}
+                for n in range(1, semesters + 1)
+            ]
+        }
+    elif match := re.search(r"Generate semester (\d+) of", prompt):
+        doc = _semester(int(match.group(1)), config.courses, config.invalid_rate)
+    elif "Generate structured curriculum" in prompt:
+        doc = {
+            "program_title": "Fake Program",
+            "semesters": [_semester(n, config.courses, config.invalid_rate) for n in range(1, semesters + 1)]
+        }
+    else:
+        line = "| Week | Topic | Activity |\n|---|---|---|\n| 1 | **Markdown** filler | Practice |\n"
+        return (line * (config.reply_chars // len(line) + 1))[:config.reply_chars]
+    return "```json\n" + json.dumps(doc, indent=2) + "\n```"
+
+
+def _envelope(text, prompt, finished=True):
+    body = {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}],
+        "usageMetadata": {
+            "promptTokenCount": len(prompt) // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (len(prompt) + len(text)) // 4
+        }
+    }
+    if finished:
+        body["candidates"][0]["finishReason"] = "STOP"
+    return body
+
+
+def _prompt_of(request):
+    parts = []
+    for content in request.get("contents", []):
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+# ────────────────────────────────────────────────
+#  Server
+# ────────────────────────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = FakeConfig()
+    stats = {"requests": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+
+        with self.lock:
+            self.stats["requests"] += 1
+        time.sleep(config.latency_ms / 1000)
+
+        if random.random() < config.error_rate:
+            with self.lock:
+                self.stats["throttled"] += 1
+            body = json.dumps({"error": {"code": 429, "message": "Resource has been exhausted (fake)",
+                                         "status": "RESOURCE_EXHAUSTED"}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", str(config.retry_after))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        prompt = _prompt_of(request)
+        text = _reply_text(prompt, config)
+        if url.path.endswith(":streamGenerateContent"):
+            self._stream(text, prompt, sse=query.get("alt") == ["sse"])
+        else:
+            body = json.dumps(_envelope(text, prompt)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _stream(self, text, prompt, sse):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [text[i:i + self.config.chunk_chars] for i in range(0, len(text), self.config.chunk_chars)]
+        if not sse:
+            # The SDK's REST transport reads one JSON array, element by element
+            self._chunk(b"[")
+        for i, piece in enumerate(pieces):
+            event = json.dumps(_envelope(piece, prompt, finished=i == len(pieces) - 1))
+            if sse:
+                self._chunk(f"data: {event}\r\n\r\n".encode())
+            else:
+                self._chunk(((",\n" if i else "") + event).encode())
+            time.sleep(self.config.chunk_delay_ms / 1000)
+        if not sse:
+            self._chunk(b"]")
+        self._chunk(b"")
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server(config=None, host="127.0.0.1", port=0):
+    """Start the fake API on a background thread; returns (server, base_url)."""
+    handler = type("FakeGeminiHandler", (_Handler,), {
+        "config": config or FakeConfig(),
+        "stats": {"requests": 0, "throttled": 0},
+        "lock": threading.Lock()
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_config_args(parser):
+    defaults = FakeConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--chunk-chars", type=int, default=defaults.chunk_chars)
+    parser.add_argument("--chunk-delay-ms", type=float, default=defaults.chunk_delay_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--invalid-rate", type=float, default=defaults.invalid_rate)
+    parser.add_argument("--courses", type=int, default=defaults.courses)
+    parser.add_argument("--reply-chars", type=int, default=defaults.reply_chars)
+
+
+def config_from_args(args):
+    return FakeConfig(
+        latency_ms=args.latency_ms,
+        chunk_chars=args.chunk_chars,
+        chunk_delay_ms=args.chunk_delay_ms,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        invalid_rate=args.invalid_rate,
+        courses=args.courses,
+        reply_chars=args.reply_chars
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_args(parser)
+    args = parser.parse_args()
+    server, url = start_server(config_from_args(args), args.host, args.port)
+    print(f"Fake Gemini listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Cold-start profile: import times per module and time to the login screen.
+
+Each measurement runs in a fresh interpreter, so nothing is warm from a previous run.
+
+Usage:
+    python benchmarks/profile_startup.py --runs 5 --top 15
+    python benchmarks/profile_startup.py --save startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py needs before anyone signs in, and what it adds afterwards
+LOGIN_IMPORTS = ["streamlit", "user_store", "passwords"]
+APP_IMPORTS = LOGIN_IMPORTS + ["google.generativeai", "response_cache", "gemini_client", "scheduler",
+                               "chat_context", "pdf_export", "curriculum", "jobs", "storage", "render",
+                               "telemetry", "retrieval"]
+HEAVY_MODULES = ["google.generativeai", "google.api_core", "requests", "reportlab", "numpy"]
+
+LOGIN_SCREEN_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+elapsed = time.perf_counter() - start
+heavy = [m for m in sys.argv[2:] if m in sys.modules]
+print(json.dumps({"seconds": elapsed, "errors": [str(e.value) for e in at.exception], "heavy_loaded": heavy}))
+"""
+
+
+def import_profile(modules):
+    """Run ``python -X importtime`` on a fresh interpreter; returns {module: (self_us, cumulative_us, top_level)}."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True,
+                          text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Indentation marks nesting; a top-level import has none
+        timings.setdefault(name.strip(), (int(self_us), int(cumulative_us), not name.startswith("  ")))
+    return timings
+
+
+def top_level_total(timings):
+    return sum(cum for _, cum, top in timings.values() if top) / 1e6
+
+
+def login_screen_time(workdir):
+    proc = subprocess.run([sys.executable, "-c", LOGIN_SCREEN_SCRIPT, os.path.join(ROOT, "app.py"),
+                           *HEAVY_MODULES], cwd=workdir, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONPATH": ROOT})
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=12, help="slowest modules to list")
+    parser.add_argument("--save", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for stage, modules in (("login_imports", LOGIN_IMPORTS), ("app_imports", APP_IMPORTS)):
+        runs = [import_profile(modules) for _ in range(args.runs)]
+        results[stage] = statistics.median(top_level_total(t) for t in runs)
+        print(f"{stage:<14} {results[stage] * 1000:8.0f} ms  ({', '.join(modules)})")
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][1], reverse=True)
+    print("\nSlowest imports after sign-in (cumulative):")
+    for name, (self_us, cum_us, _) in slowest[:args.top]:
+        print(f"  {cum_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms self  {name}")
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:  # keep users.db out of the checkout
+            screens = [login_screen_time(workdir) for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(f"\nLogin screen: not measured ({e})")
+    else:
+        results["login_screen"] = statistics.median(s["seconds"] for s in screens)
+        results["heavy_on_login"] = screens[-1]["heavy_loaded"]
+        print(f"\nTime to login screen (fresh process, incl. streamlit): {results['login_screen'] * 1000:.0f} ms")
+        print(f"Heavy modules loaded on the login screen: {', '.join(results['heavy_on_login']) or 'none'}")
+        if screens[-1]["errors"]:
+            print(f"App errors: {screens[-1]['errors']}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""End-to-end benchmarks for CurricuForge against a local fake Gemini server.
+
+Usage:
+    python benchmarks/run_bench.py --users 8 --iterations 5 --latency-ms 300
+    python benchmarks/run_bench.py --only chat_turn quick_fanout --error-rate 0.1
+    python benchmarks/run_bench.py --save baseline.json
+    python benchmarks/run_bench.py --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import google.generativeai as genai  # noqa: E402
+
+from chat_context import ChatContext  # noqa: E402
+from curriculum import (CurriculumStreamParser, build_prompt, generate_fanout, make_payload,  # noqa: E402
+                        response_text)
+from fake_gemini import add_config_args, config_from_args, start_server  # noqa: E402
+from gemini_client import GeminiClient  # noqa: E402
+from passwords import hash_password, verify_password  # noqa: E402
+from pdf_export import PdfCache, generate_pdf  # noqa: E402
+from retrieval import HashingEmbedder, RetrievalIndex, curriculum_text  # noqa: E402
+from storage import WorkspaceStore  # noqa: E402
+from telemetry import percentile  # noqa: E402
+from user_store import SQLiteUserStore  # noqa: E402
+
+CHAT_MODEL = "gemini-2.5-flash-lite"
+QUICK_MODEL = "gemini-2.5-flash"
+SPEC = {"skill": "Machine Learning", "level": "BTech", "semesters": 8, "weekly_hours": 20,
+        "industry": "AI & Data Science"}
+GREETING = [{"role": "model", "parts": ["Hello! What curriculum would you like to create?"]}]
+INDEX_DOCS = 5000
+
+
+class Env:
+    def __init__(self, args, base_url, workdir):
+        self.args = args
+        self.base_url = base_url
+        self.workdir = workdir
+        self.client = GeminiClient("fake-key", base_url=f"{base_url}/v1", max_concurrency=max(8, args.users * 2),
+                                   base_delay=0.05, max_delay=1.0)
+        self.chat_model = self.client.model(CHAT_MODEL, system_instruction="You are Curriculum Designer.")
+        self.curriculum = json.loads(response_text(
+            self.client.post_generate(QUICK_MODEL, make_payload(build_prompt(**SPEC)))
+        ).replace("```json", "").replace("```", ""))
+        self.pdf_cache = PdfCache()
+        self.users = SQLiteUserStore(os.path.join(workdir, "users.db"), legacy_json=None)
+        self.users.add_user("bench", hash_password("bench-password"))
+        # The offline embedder keeps this scenario about index search cost, not embedding API latency
+        self.embedder = HashingEmbedder()
+        self.index = RetrievalIndex(os.path.join(workdir, "retrieval_index.npz"), self.embedder.name)
+        self.index.add([
+            {"id": f"curriculum:{i}", "kind": "curriculum", "ref": i, "user": "bench",
+             "title": f"Program {i}", "text": curriculum_text({**SPEC, "skill": f"Skill {i % 300}"}, self.curriculum)}
+            for i in range(INDEX_DOCS)
+        ], self.embedder)
+        self.index.flush()  # write now, while the temporary directory still exists
+
+
+# ────────────────────────────────────────────────
+#  Scenarios: each factory returns one simulated user's operation
+# ────────────────────────────────────────────────
+def chat_turn(env):
+    ctx = ChatContext.from_messages(env.chat_model, CHAT_MODEL, GREETING)
+
+    def op():
+        prompt = "Design a 6-week Python course for grade 9, project-based."
+        response = ctx.send(env.client, prompt, stream=True)
+        text = "".join(chunk.text for chunk in response)
+        ctx.record(response, prompt, text)
+    return op
+
+
+def quick_single(env):
+    def op():
+        parser = CurriculumStreamParser()
+        parser.feed(response_text(env.client.post_generate(QUICK_MODEL, make_payload(build_prompt(**SPEC)))))
+        assert parser.result()[1]
+    return op
+
+
+def quick_stream(env):
+    def op():
+        parser = CurriculumStreamParser()
+        for piece in env.client.stream_generate(QUICK_MODEL, make_payload(build_prompt(**SPEC))):
+            parser.feed(piece)
+        assert parser.result()[1]
+    return op
+
+
+def quick_fanout(env):
+    def op():
+        generate_fanout(env.client, QUICK_MODEL, SPEC)
+    return op
+
+
+def summarize(env):
+    def op():
+        env.client.generate_content(CHAT_MODEL, "Summarize this curriculum discussion concisely in markdown:\n\n...")
+    return op
+
+
+def add_section(env):
+    def op():
+        env.client.generate_content(CHAT_MODEL, "Create clean markdown notes on: 'Assessment'\nContext: ...")
+    return op
+
+
+def pdf_cold(env):
+    def op():
+        generate_pdf(env.curriculum)
+    return op
+
+
+def pdf_cached(env):
+    env.pdf_cache.get_or_build(env.curriculum)
+
+    def op():
+        env.pdf_cache.get_or_build(env.curriculum)
+    return op
+
+
+def login(env):
+    def op():
+        assert verify_password("bench-password", env.users.get_hash("bench"))
+    return op
+
+
+def retrieval_search(env):
+    def op():
+        env.index.search("Machine Learning · Masters · AI & Data Science", env.embedder, k=3)
+    return op
+
+
+SCENARIOS = {f.__name__: f for f in [chat_turn, quick_single, quick_stream, quick_fanout, summarize, add_section,
+                                      pdf_cold, pdf_cached, login, retrieval_search]}
+
+
+# ────────────────────────────────────────────────
+#  Runner
+# ────────────────────────────────────────────────
+def summarize_latencies(latencies, wall, errors=0):
+    return {
+        "n": len(latencies),
+        "errors": errors,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "throughput": len(latencies) / wall if wall else 0.0
+    }
+
+
+def run_scenario(env, factory, users, iterations):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def simulated_user(_):
+        op = factory(env)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            try:
+                op()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(simulated_user, range(users)))
+    return summarize_latencies(latencies, time.perf_counter() - wall_start, errors[0])
+
+
+def measure_session_memory(env, turns):
+    """Retained bytes for one chat session of ``turns`` turns plus a generated curriculum."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ctx = ChatContext.from_messages(env.chat_model, CHAT_MODEL, GREETING)
+    messages = list(GREETING)
+    for _ in range(turns):
+        prompt = "Add a week on evaluation metrics."
+        response = ctx.send(env.client, prompt)
+        messages += [{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [response.text]}]
+    session = {"chat_context": ctx, "messages": messages, "curriculum": json.loads(json.dumps(env.curriculum))}
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del session
+    return retained
+
+
+def measure_reruns(env, messages, reruns):
+    """Time full Streamlit reruns of app.py with a long transcript in session state."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+
+    # The app opens the user's latest stored conversation, so seed the transcript there
+    workspace = WorkspaceStore(os.path.join(env.workdir, "workspace.db"))
+    conversation_id = workspace.create_conversation("bench")
+    workspace.append_message(conversation_id, "model", GREETING[0]["parts"][0])
+    for i in range(messages // 2):
+        workspace.append_message(conversation_id, "user", f"Refine week {i}.")
+        workspace.append_message(conversation_id, "model", "| Week | Topic |\n|---|---|\n| 1 | Intro |\n" * 40)
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.secrets["GEMINI_API_KEY"] = "fake-key"
+    at.session_state["logged_in"] = True
+    at.session_state["username"] = "bench"
+    at.session_state["curriculum"] = env.curriculum
+    at.run()
+    assert not at.exception, f"app.py raised: {[e.value for e in at.exception]}"
+
+    latencies = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+        # A rerun that crashes part-way is fast for the wrong reason
+        assert not at.exception, f"app.py raised: {[e.value for e in at.exception]}"
+    return summarize_latencies(latencies, sum(latencies))
+
+
+def print_table(results):
+    print(f"\n{'scenario':<16}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['n']:>6}{r['errors']:>5}{r['p50'] * 1000:>10.1f}{r['p95'] * 1000:>10.1f}"
+              f"{r['p99'] * 1000:>10.1f}{r['throughput']:>9.2f}")
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    regressions = []
+    for name, r in results.items():
+        if name in baseline and r["p95"] > baseline[name]["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {baseline[name]['p95'] * 1000:.1f} → {r['p95'] * 1000:.1f} ms")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=4, help="simulated concurrent users")
+    parser.add_argument("--iterations", type=int, default=3, help="operations per user per scenario")
+    parser.add_argument("--only", nargs="*", choices=sorted(SCENARIOS), help="run a subset of scenarios")
+    parser.add_argument("--session-turns", type=int, default=10, help="chat turns for the memory measurement")
+    parser.add_argument("--rerun-messages", type=int, default=60, help="transcript length for rerun timing")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check p95 regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs baseline")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server, base_url = start_server(config)
+    genai.configure(api_key="fake-key", transport="rest", client_options={"api_endpoint": base_url})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # keep the app's SQLite files out of the checkout
+        try:
+            env = Env(args, base_url, workdir)
+            results = {}
+            for name in args.only or SCENARIOS:
+                results[name] = run_scenario(env, SCENARIOS[name], args.users, args.iterations)
+                print(f"  {name}: done")
+
+            if not args.only:
+                memory = measure_session_memory(env, args.session_turns)
+                # Runs app.py itself, which reconfigures genai, so it goes last
+                rerun = measure_reruns(env, args.rerun_messages, args.reruns)
+                if rerun:
+                    results["app_rerun"] = rerun
+        finally:
+            os.chdir(cwd)
+
+    print(f"\nFake API: {config} — {server.RequestHandlerClass.stats['requests']} requests, "
+          f"{server.RequestHandlerClass.stats['throttled']} throttled")
+    print_table(results)
+    if not args.only:
+        print(f"\nMemory per session ({args.session_turns} chat turns + curriculum): {memory / 1024:.0f} KiB")
+    metrics = env.client.metrics()
+    print(f"Client: {metrics['calls']} calls, {metrics['retries']} retries, {metrics['errors']} errors")
+    server.shutdown()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": vars(args), "scenarios": results}, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
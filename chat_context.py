@@ -0,0 +1,127 @@
+import threading
+
+# ────────────────────────────────────────────────
+#  Per-session chat context with a token budget
+# ────────────────────────────────────────────────
+DEFAULT_BUDGET = 12000
+KEEP_RECENT = 4
+SUMMARY_MODEL = "gemini-2.5-flash-lite"
+STRATEGIES = ["summarize", "drop"]
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for English markdown
+    return max(1, len(text) // 4)
+
+
+def content_text(content):
+    if isinstance(content, dict):
+        return content["parts"][0]
+    return "".join(getattr(p, "text", "") for p in content.parts)
+
+
+class ChatContext:
+    """Keeps one ChatSession alive across reruns so each turn only appends the new exchange."""
+
+    def __init__(self, model, model_name, history=None, budget=DEFAULT_BUDGET, strategy="summarize",
+                 system_instruction=None):
+        self.model = model
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.budget = budget
+        self.strategy = strategy
+        self.chat = model.start_chat(history=history or [])
+        self.context_tokens = sum(estimate_tokens(content_text(c)) for c in self.chat.history)
+        self.compactions = 0
+        self._fallback_chat = None
+        self._lock = threading.Lock()
+        self.reference_used = False  # a saved program has already grounded a turn of this conversation
+
+    @classmethod
+    def from_messages(cls, model, model_name, messages, **kwargs):
+        history = []
+        for m in messages:
+            role = "model" if m["role"] == "model" else "user"
+            content = m["parts"][0] if "parts" in m else m.get("content", "")
+            history.append({"role": role, "parts": [content]})
+        ctx = cls(model, model_name, history=history, **kwargs)
+        ctx.reference_used = any(m.get("reference") for m in messages)
+        return ctx
+
+    def send(self, client, prompt, model_name=None, **kwargs):
+        """Send on the live session, or on a same-history session of ``model_name`` (quota fallback)."""
+        with self._lock:
+            if model_name is None or model_name == self.model_name:
+                self._fallback_chat = None
+                return client.send_message(self.chat, prompt, **kwargs)
+            history = list(self.chat.history)
+            fallback = client.model(model_name, self.system_instruction).start_chat(history=history)
+            self._fallback_chat = fallback
+            return client.send_message(fallback, prompt, **kwargs)
+
+    def record(self, response, prompt, reply):
+        """Account for a finished turn; returns the token counts to show beside it."""
+        if self._fallback_chat is not None:
+            # Carry the turn answered by the fallback model back into the primary session
+            self.chat = self.model.start_chat(history=list(self._fallback_chat.history))
+            self._fallback_chat = None
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or self.context_tokens + estimate_tokens(prompt)
+        output_tokens = getattr(usage, "candidates_token_count", 0) or estimate_tokens(reply)
+        self.context_tokens = prompt_tokens + output_tokens
+        return {"prompt": prompt_tokens, "output": output_tokens, "context": self.context_tokens}
+
+    def replace_last_prompt(self, prompt, sent):
+        """Keep ``prompt`` in the session in place of ``sent``, the longer text the last turn was sent with."""
+        with self._lock:
+            history = list(self.chat.history)
+            self.chat.history = history[:-2] + [{"role": "user", "parts": [prompt]}, history[-1]]
+            self.context_tokens -= estimate_tokens(sent) - estimate_tokens(prompt)
+
+    def broken(self):
+        """True when the last reply broke off mid-stream or stopped early (e.g. SAFETY): the SDK then refuses
+        to read or extend that session, so the caller must start over from the stored transcript."""
+        try:
+            list((self._fallback_chat or self.chat).history)
+        except Exception:
+            return True
+        return False
+
+    def over_budget(self):
+        return self.context_tokens > self.budget
+
+    def compact(self, client):
+        """Shrink the session to fit the budget. Safe to run beside a new turn: if one starts while the
+        summary is being written, the compacted history is discarded and the next turn tries again."""
+        with self._lock:
+            chat = self.chat
+            history = list(chat.history)
+        if len(history) <= KEEP_RECENT:
+            return False
+        old, recent = history[:-KEEP_RECENT], history[-KEEP_RECENT:]
+
+        new_history = []
+        if self.strategy == "summarize":
+            transcript = "\n".join(f"{c.role}: {content_text(c)}" for c in old)
+            resp = client.generate_content(
+                SUMMARY_MODEL,
+                "Summarize this curriculum design conversation so it can replace the original turns. "
+                f"Keep every decision, requirement and open question:\n\n{transcript}"
+            )
+            new_history = [
+                {"role": "user", "parts": [f"Summary of our earlier conversation:\n{resp.text}"]},
+                {"role": "model", "parts": ["Thanks, I'll continue from that summary."]}
+            ]
+        new_history += [{"role": c.role, "parts": [content_text(c)]} for c in recent]
+
+        with self._lock:
+            try:
+                unchanged = self.chat is chat and len(chat.history) == len(history)
+            except Exception:
+                unchanged = False  # a reply is still streaming on the session
+            if not unchanged:
+                return False
+            self.chat = self.model.start_chat(history=new_history)
+            self.context_tokens = sum(estimate_tokens(content_text(c)) for c in new_history)
+            self.compactions += 1
+        return True
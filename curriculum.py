@@ -0,0 +1,444 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from schema import (COURSE_SCHEMA, CURRICULUM_SCHEMA, SEMESTER_SCHEMA, SKELETON_SCHEMA, describe, validate_course,
+                    validate_curriculum, validate_semester)
+
+REPAIR_ROUNDS = 2
+
+# ────────────────────────────────────────────────
+#  Prompts
+# ────────────────────────────────────────────────
+def seed_block(seed):
+    if not seed:
+        return ""
+    return f"""
+A similar program we already run (adapt what fits, change what the spec above requires):
+{seed}
+"""
+
+
+def build_prompt(skill, level, semesters, weekly_hours, industry, seed=None):
+    return f"""
+Generate structured curriculum in pure JSON.
+
+Skill: {skill}
+Level: {level}
+Semesters: {semesters}
+Weekly Hours: {weekly_hours}
+Focus: {industry}
+{seed_block(seed)}
+Return ONLY valid JSON:
+
+{{
+  "program_title": "",
+  "semesters": [
+    {{
+      "semester": 1,
+      "courses": [
+        {{
+          "course_name": "",
+          "credits": "",
+          "topics": [""],
+          "learning_outcomes": [""]
+        }}
+      ]
+    }}
+  ]
+}}
+"""
+
+
+def build_skeleton_prompt(skill, level, semesters, weekly_hours, industry, seed=None):
+    return f"""
+Plan the outline of a curriculum in pure JSON. Do not write topics or outcomes yet.
+
+Skill: {skill}
+Level: {level}
+Semesters: {semesters}
+Weekly Hours: {weekly_hours}
+Focus: {industry}
+{seed_block(seed)}
+Return ONLY valid JSON with exactly {semesters} semesters:
+
+{{
+  "program_title": "",
+  "semesters": [
+    {{
+      "semester": 1,
+      "theme": "",
+      "course_names": [""]
+    }}
+  ]
+}}
+"""
+
+
+def build_semester_prompt(skill, level, semesters, weekly_hours, industry, program_title, number, existing=(),
+                          plan=None):
+    taken = ", ".join(c.get("course_name", "") for sem in existing for c in sem.get("courses", []))
+    outline = ""
+    if plan:
+        outline = (f"Semester theme: {plan.get('theme', '')}\n"
+                   f"Planned courses (use these names): {', '.join(plan.get('course_names', []))}\n")
+    return f"""
+Generate semester {number} of {semesters} for the program "{program_title}" in pure JSON.
+
+Skill: {skill}
+Level: {level}
+Weekly Hours: {weekly_hours}
+Focus: {industry}
+{outline}Courses already in other semesters (do not repeat): {taken or "none"}
+
+Return ONLY valid JSON:
+
+{{
+  "semester": {number},
+  "courses": [
+    {{
+      "course_name": "",
+      "credits": "",
+      "topics": [""],
+      "learning_outcomes": [""]
+    }}
+  ]
+}}
+"""
+
+
+def build_course_prompt(skill, level, semesters, weekly_hours, industry, program_title, number, course, problems,
+                        siblings=()):
+    draft = json.dumps(course, indent=2) if isinstance(course, dict) else "none"
+    others = ", ".join(c.get("course_name", "") for c in siblings if isinstance(c, dict))
+    return f"""
+Fix one course from semester {number} of {semesters} of the program "{program_title}" in pure JSON.
+
+Skill: {skill}
+Level: {level}
+Weekly Hours: {weekly_hours}
+Focus: {industry}
+Other courses this semester (do not repeat): {others or "none"}
+
+Current draft:
+{draft}
+
+Problems: {problems}
+Keep everything in the draft that is already correct and fill in what is missing.
+
+Return ONLY valid JSON:
+
+{{
+  "course_name": "",
+  "credits": "",
+  "topics": [""],
+  "learning_outcomes": [""]
+}}
+"""
+
+
+def strip_fences(text):
+    return text.replace("```json", "").replace("```", "").strip()
+
+
+# ────────────────────────────────────────────────
+#  Incremental parsing
+# ────────────────────────────────────────────────
+_TITLE_RE = re.compile(r'"program_title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_SEMESTERS_KEY_RE = re.compile(r'"semesters"\s*:\s*$')
+
+
+class CurriculumStreamParser:
+    """Feed raw model output chunk by chunk; each semester object is returned as soon as it closes."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.program_title = None
+        self.semesters = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._array_depth = None
+        self._obj_start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "[" and self._array_depth is None and _SEMESTERS_KEY_RE.search(buf, 0, i):
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._obj_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._array_depth is None:
+                    continue
+                if ch == "}" and self._depth == self._array_depth and self._obj_start is not None:
+                    try:
+                        sem = json.loads(buf[self._obj_start:i + 1])
+                    except ValueError:
+                        sem = None
+                    if isinstance(sem, dict):
+                        self.semesters.append(sem)
+                        completed.append(sem)
+                    self._obj_start = None
+                elif ch == "]" and self._depth < self._array_depth:
+                    self._array_depth = -1  # semesters array finished; ignore anything after it
+        self._pos = len(buf)
+
+        if self.program_title is None:
+            match = _TITLE_RE.search(buf)
+            if match:
+                self.program_title = json.loads(f'"{match.group(1)}"')
+        return completed
+
+    def result(self):
+        """The full document if it parses, else whatever was salvaged from the stream."""
+        try:
+            data = json.loads(strip_fences(self.buffer))
+            if isinstance(data, dict):
+                return data, True
+        except ValueError:
+            pass
+        return {"program_title": self.program_title or "", "semesters": list(self.semesters)}, False
+
+
+def semester_number(sem):
+    try:
+        return int(sem.get("semester"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def missing_semesters(curriculum, expected):
+    have = {semester_number(sem) for sem in curriculum.get("semesters", [])}
+    return [n for n in range(1, expected + 1) if n not in have]
+
+
+def merge_semesters(curriculum, extra):
+    semesters = curriculum.get("semesters", []) + list(extra)
+    semesters.sort(key=semester_number)
+    return {**curriculum, "semesters": semesters}
+
+
+# ────────────────────────────────────────────────
+#  Generation helpers
+# ────────────────────────────────────────────────
+def make_payload(prompt, schema=None):
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if schema:
+        payload["generationConfig"] = {"responseMimeType": "application/json", "responseSchema": schema}
+    return payload
+
+
+def response_text(result):
+    if "error" in result:
+        raise RuntimeError(f"API Error: {result['error']['message']}")
+    return result["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def fetch_json(client, model_name, prompt, schema):
+    text = response_text(client.post_generate(model_name, make_payload(prompt, schema)))
+    return json.loads(strip_fences(text))
+
+
+def fetch_semester(client, model_name, prompt):
+    return fetch_json(client, model_name, prompt, SEMESTER_SCHEMA)
+
+
+def _normalize_course(course):
+    """Fix what needs no model call (numeric credits); anything else is left for validation to flag."""
+    if isinstance(course, dict) and isinstance(course.get("credits"), (int, float)):
+        return {**course, "credits": str(course["credits"])}
+    return course
+
+
+def _repair_tasks(spec, curriculum):
+    """(kind, semester number, course index, prompt) for every missing semester and invalid course."""
+    title = curriculum["program_title"]
+    semesters = curriculum["semesters"]
+    tasks = []
+    for n in missing_semesters(curriculum, spec["semesters"]):
+        prompt = build_semester_prompt(**spec, program_title=title, number=n, existing=semesters)
+        tasks.append(("semester", n, None, prompt))
+    for sem in semesters:
+        n = semester_number(sem)
+        courses = sem.get("courses")
+        if not isinstance(courses, list) or not courses:
+            others = [other for other in semesters if other is not sem]
+            prompt = build_semester_prompt(**spec, program_title=title, number=n, existing=others)
+            tasks.append(("semester", n, None, prompt))
+            continue
+        for i, course in enumerate(courses):
+            problems = validate_course(course)
+            if problems:
+                prompt = build_course_prompt(**spec, program_title=title, number=n, course=course,
+                                             problems=describe(problems), siblings=courses[:i] + courses[i + 1:])
+                tasks.append(("course", n, i, prompt))
+    return tasks
+
+
+def _improves(fix, draft, validate):
+    """A repair replaces its draft only if it validates, or at least has fewer problems than the draft.
+    A missing draft (``None``) or one that is not an object is replaced by any object."""
+    problems = validate(fix)
+    return not problems or not isinstance(draft, dict) or len(problems) < len(validate(draft))
+
+
+def repair_curriculum(client, model_name, spec, curriculum, max_workers=4):
+    """Validate a curriculum and re-request only the semesters or single courses that fail.
+
+    Returns ``(curriculum, repaired)`` where ``repaired`` counts the sub-objects that were re-requested.
+    A repair that is no better than the draft is discarded, and courses that are not objects are dropped
+    from the result, so callers can always read it with ``dict.get``.
+    """
+    title = curriculum.get("program_title")
+    if not isinstance(title, str) or not title.strip():
+        title = f"{spec['skill']} ({spec['level']})"
+    semesters = {}
+    for sem in curriculum.get("semesters") or []:
+        # Objects without a usable semester number cannot be placed; that number is regenerated instead
+        n = semester_number(sem) if isinstance(sem, dict) else 0
+        if 0 < n <= spec["semesters"] and n not in semesters:
+            courses = sem.get("courses")
+            if isinstance(courses, list):
+                courses = [_normalize_course(c) for c in courses]
+            semesters[n] = {**sem, "semester": n, "courses": courses}
+    curriculum = {**curriculum, "program_title": title, "semesters": [semesters[n] for n in sorted(semesters)]}
+
+    repaired = 0
+    for _ in range(REPAIR_ROUNDS):
+        tasks = _repair_tasks(spec, curriculum)
+        if not tasks:
+            break
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(fetch_json, client, model_name, prompt,
+                            SEMESTER_SCHEMA if kind == "semester" else COURSE_SCHEMA)
+                for kind, _, _, prompt in tasks
+            ]
+            fixes = []
+            for future in futures:
+                try:
+                    fixes.append(future.result())
+                except Exception:
+                    fixes.append(None)  # keep the unrepaired part; one failed call must not sink the program
+        repaired += len(tasks)
+
+        by_number = {semester_number(sem): sem for sem in curriculum["semesters"]}
+        for (kind, n, i, _), fix in zip(tasks, fixes):
+            if not isinstance(fix, dict):
+                continue
+            if kind == "semester":
+                courses = fix.get("courses")
+                if not isinstance(courses, list):
+                    continue
+                fix = {"semester": n, "courses": [_normalize_course(c) for c in courses if isinstance(c, dict)]}
+                draft = by_number.get(n)
+                if draft is not None and not (isinstance(draft.get("courses"), list) and draft["courses"]):
+                    draft = None  # a semester without courses takes any courses at all
+                if fix["courses"] and _improves(fix, draft, validate_semester):
+                    by_number[n] = fix
+            else:
+                fix = _normalize_course(fix)
+                if _improves(fix, by_number[n]["courses"][i], validate_course):
+                    by_number[n]["courses"][i] = fix
+        curriculum = {**curriculum, "semesters": [by_number[n] for n in sorted(by_number)]}
+
+    semesters = [
+        {**sem, "courses": [c for c in sem["courses"] if isinstance(c, dict)] if isinstance(sem["courses"], list)
+         else []}
+        for sem in curriculum["semesters"]
+    ]
+    return {**curriculum, "semesters": semesters}, repaired
+
+
+def is_complete(spec, curriculum):
+    """Every requested semester is present and the whole program passes schema validation."""
+    return not missing_semesters(curriculum, spec["semesters"]) and not validate_curriculum(curriculum)
+
+
+def generate_fanout(client, model_name, spec, max_workers=4, on_semester=None, seed=None):
+    """Fetch a program skeleton, then generate every semester concurrently and merge them.
+
+    A semester whose call fails is left out for repair_curriculum to re-request; only a program with no
+    semester at all raises. ``on_semester`` is called from the calling thread as each semester finishes.
+    """
+    skeleton = fetch_json(client, model_name, build_skeleton_prompt(**spec, seed=seed), SKELETON_SCHEMA)
+    program_title = skeleton.get("program_title", "")
+    plans = {semester_number(p): p for p in skeleton.get("semesters", [])}
+    planned = [{"courses": [{"course_name": n} for n in p.get("course_names", [])]} for p in plans.values()]
+
+    semesters = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = []
+        for n in range(1, spec["semesters"] + 1):
+            plan = plans.get(n)
+            others = [sem for sem, p in zip(planned, plans.values()) if p is not plan]
+            prompt = build_semester_prompt(**spec, program_title=program_title, number=n, existing=others, plan=plan)
+            futures.append(pool.submit(fetch_semester, client, model_name, prompt))
+        error = None
+        for future in as_completed(futures):
+            try:
+                sem = future.result()
+                if not isinstance(sem, dict):
+                    raise ValueError("semester response is not an object")
+            except Exception as e:
+                error = e
+                continue
+            semesters.append(sem)
+            if on_semester:
+                on_semester(sem)
+    if error is not None and not semesters:
+        raise error
+
+    return merge_semesters({"program_title": program_title, "semesters": []}, semesters)
+
+
+def generate_curriculum(client, model_name, spec, parallel=False, stream=True, on_semester=None, seed=None):
+    """Run one Quick Curriculum generation end to end; returns ``(curriculum, complete)``.
+
+    The response is validated against the schema and only the semesters or courses that fail are
+    re-requested; ``complete`` is False when the program still fails validation after that, so callers
+    should not cache it. ``seed`` is an outline of a similar saved program for the model to adapt.
+    """
+    if parallel:
+        curriculum = generate_fanout(client, model_name, spec, on_semester=on_semester, seed=seed)
+        curriculum, _ = repair_curriculum(client, model_name, spec, curriculum)
+        return curriculum, is_complete(spec, curriculum)
+
+    parser = CurriculumStreamParser()
+    payload = make_payload(build_prompt(**spec, seed=seed), CURRICULUM_SCHEMA)
+    if stream:
+        try:
+            for piece in client.stream_generate(model_name, payload):
+                for sem in parser.feed(piece):
+                    if on_semester:
+                        on_semester(sem)
+        except Exception:
+            # Keep whatever semesters already arrived; only a total loss is fatal
+            if not parser.semesters:
+                raise
+    else:
+        parser.feed(response_text(client.post_generate(model_name, payload)))
+
+    curriculum, parsed = parser.result()
+    if not parsed and not curriculum["semesters"]:
+        raise ValueError("response contained no complete semester")
+    curriculum, _ = repair_curriculum(client, model_name, spec, curriculum)
+    return curriculum, is_complete(spec, curriculum)
@@ -0,0 +1,350 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import google.generativeai as genai
+import requests
+from google.api_core.exceptions import DeadlineExceeded, GoogleAPICallError, RetryError
+from requests.adapters import HTTPAdapter
+
+from telemetry import current_labels, percentile
+
+# ────────────────────────────────────────────────
+#  Shared Gemini client: pooling, timeouts, retries, metrics
+# ────────────────────────────────────────────────
+API_BASE = "https://generativelanguage.googleapis.com/v1"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_quota_retries = ContextVar("quota_retries", default=True)
+
+
+@contextmanager
+def without_quota_retries():
+    """Raise a 429 at once inside the block instead of backing off, for callers that fall back to another
+    model on quota errors (the Scheduler). 5xx and network errors are still retried."""
+    token = _quota_retries.set(False)
+    try:
+        yield
+    finally:
+        _quota_retries.reset(token)
+
+
+class GeminiClient:
+    """One per process: every Gemini call in the app goes through here.
+
+    ``timeout`` bounds a blocking call, and each read of a REST stream. An SDK stream has only a deadline
+    for the whole reply, so it gets the longer ``stream_timeout`` instead.
+    """
+
+    def __init__(self, api_key, max_concurrency=8, timeout=60, max_retries=4,
+                 base_delay=1.0, max_delay=30.0, base_url=API_BASE, telemetry=None, stream_timeout=600):
+        self.api_key = api_key
+        self.telemetry = telemetry
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._models = {}
+        self._in_flight = 0
+        self._calls = 0
+        self._retries = 0
+        self._errors = 0
+        self._latencies = deque(maxlen=500)
+
+    # ── models ──────────────────────────────────
+    def model(self, model_name, system_instruction=None):
+        key = (model_name, system_instruction)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(
+                    model_name=model_name,
+                    system_instruction=system_instruction
+                )
+            return self._models[key]
+
+    # ── calls ───────────────────────────────────
+    def generate_content(self, model_name, prompt, **kwargs):
+        return self._traced("generate_content", model_name, self.model(model_name).generate_content, prompt,
+                            request_options=self._request_options(kwargs), **kwargs)
+
+    def send_message(self, chat, prompt, **kwargs):
+        model_name = chat.model.model_name.removeprefix("models/")
+        return self._traced("send_message", model_name, chat.send_message, prompt,
+                            request_options=self._request_options(kwargs), **kwargs)
+
+    def _request_options(self, kwargs):
+        return {"timeout": self.stream_timeout if kwargs.get("stream") else self.timeout}
+
+    def post_generate(self, model_name, payload):
+        """Raw REST generateContent; returns the decoded JSON body (which may hold an "error")."""
+        url = f"{self.base_url}/models/{model_name}:generateContent"
+
+        def _post():
+            resp = self.session.post(url, params={"key": self.api_key}, json=payload, timeout=self.timeout)
+            if resp.status_code in RETRYABLE_STATUS:
+                raise _RetryableHTTPError(resp)
+            return _json_body(resp)
+
+        trace = self._start_trace("post_generate", model_name)
+        try:
+            result = self._call(_post, (), {}, trace)
+        except _RetryableHTTPError as e:
+            result = _json_body(e.response)
+        except Exception as e:
+            self._finish_trace(trace, error=type(e).__name__)
+            raise
+        error = result.get("error")
+        self._finish_trace(trace, usage=_usage(result), error=error and f"HTTP {error.get('code')}")
+        return result
+
+    def stream_generate(self, model_name, payload):
+        """Raw REST streamGenerateContent (SSE); yields text pieces as they arrive.
+
+        Retries only cover opening the stream; once text has been yielded a failure propagates.
+        """
+        url = f"{self.base_url}/models/{model_name}:streamGenerateContent"
+
+        def _open():
+            resp = self.session.post(url, params={"key": self.api_key, "alt": "sse"}, json=payload,
+                                     timeout=self.timeout, stream=True)
+            if resp.status_code in RETRYABLE_STATUS:
+                raise _RetryableHTTPError(resp)
+            if resp.status_code != 200:
+                raise RuntimeError(f"API Error: {_json_body(resp)['error'].get('message', resp.status_code)}")
+            return resp
+
+        trace = self._start_trace("stream_generate", model_name)
+        usage, error = None, None
+        try:
+            resp = self._call(_open, (), {}, trace)
+            with resp:
+                for line in resp.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[len("data:"):])
+                    usage = _usage(event) or usage
+                    for candidate in event.get("candidates", []):
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if "text" in part:
+                                trace.setdefault("ttft", time.perf_counter() - trace["start"])
+                                yield part["text"]
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._finish_trace(trace, usage=usage, error=error)
+
+    def embed(self, model_name, texts, dim=None, task=None, retry=True):
+        """REST batchEmbedContents; returns one vector (list of floats) per text. ``retry=False`` makes one
+        attempt only, for lookups someone is waiting on."""
+        url = f"{self.base_url}/models/{model_name}:batchEmbedContents"
+        request = {"model": f"models/{model_name}"}
+        if dim:
+            request["outputDimensionality"] = dim
+        if task:
+            request["taskType"] = task
+        payload = {"requests": [{**request, "content": {"parts": [{"text": t}]}} for t in texts]}
+
+        def _post():
+            resp = self.session.post(url, params={"key": self.api_key}, json=payload, timeout=self.timeout)
+            if resp.status_code in RETRYABLE_STATUS:
+                raise _RetryableHTTPError(resp)
+            body = _json_body(resp)
+            if "error" in body:
+                raise RuntimeError(f"API Error: {body['error'].get('message', resp.status_code)}")
+            return [e["values"] for e in body["embeddings"]]
+
+        trace = self._start_trace("embed", model_name)
+        try:
+            result = self._call(_post, (), {}, trace, max_retries=None if retry else 0)
+        except Exception as e:
+            self._finish_trace(trace, error=type(e).__name__)
+            raise
+        self._finish_trace(trace)
+        return result
+
+    def _call(self, fn, args, kwargs, trace=None, max_retries=None):
+        max_retries = self.max_retries if max_retries is None else max_retries
+        quota_retries = _quota_retries.get()
+        attempt = 0
+        with self._lock:
+            self._calls += 1
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    # A slot is held only while a request is on the wire, never through a backoff sleep,
+                    # so a 429 storm does not starve callers that could go ahead
+                    with self._slots:
+                        with self._lock:
+                            self._in_flight += 1
+                        try:
+                            return fn(*args, **kwargs)
+                        finally:
+                            with self._lock:
+                                self._in_flight -= 1
+                except Exception as e:
+                    if attempt >= max_retries or not _is_retryable(e) or (not quota_retries and _is_quota(e)):
+                        with self._lock:
+                            self._errors += 1
+                        raise
+                    attempt += 1
+                    with self._lock:
+                        self._retries += 1
+                    if trace is not None:
+                        trace["retries"] = attempt
+                    time.sleep(self._backoff(attempt, _retry_after(e)))
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+
+    # ── tracing ─────────────────────────────────
+    def _start_trace(self, kind, model_name):
+        # Labels are captured here, on the caller's thread, where tagged() is in effect
+        return {"kind": kind, "model": model_name, "start": time.perf_counter(), "retries": 0,
+                "labels": current_labels()}
+
+    def _finish_trace(self, trace, usage=None, error=None):
+        if self.telemetry is None:
+            return
+        prompt_tokens, output_tokens = usage or (0, 0)
+        self.telemetry.record(
+            trace["kind"], trace["model"], latency=time.perf_counter() - trace["start"], ttft=trace.get("ttft"),
+            prompt_tokens=prompt_tokens, output_tokens=output_tokens, retries=trace["retries"], error=error,
+            user=trace["labels"].get("user")
+        )
+
+    def _traced(self, kind, model_name, fn, *args, **kwargs):
+        trace = self._start_trace(kind, model_name)
+        try:
+            result = self._call(fn, args, kwargs, trace)
+        except Exception as e:
+            self._finish_trace(trace, error=type(e).__name__)
+            raise
+        if kwargs.get("stream"):
+            return _TracedStream(result, self, trace)
+        self._finish_trace(trace, usage=_usage(result))
+        return result
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter keeps many clients from retrying in lock-step
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    # ── metrics ─────────────────────────────────
+    def metrics(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "in_flight": self._in_flight,
+                "calls": self._calls,
+                "retries": self._retries,
+                "errors": self._errors,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95)
+            }
+
+
+class _TracedStream:
+    """Wraps an SDK streaming response so the call is recorded once the stream is drained."""
+
+    def __init__(self, response, client, trace):
+        self._response = response
+        self._client = client
+        self._trace = trace
+
+    def __iter__(self):
+        error = None
+        try:
+            for chunk in self._response:
+                self._trace.setdefault("ttft", time.perf_counter() - self._trace["start"])
+                yield chunk
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._client._finish_trace(self._trace, usage=_usage(self._response), error=error)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+def _usage(result):
+    """(prompt, output) token counts from an SDK response or a REST body, if reported."""
+    if isinstance(result, dict):
+        usage = result.get("usageMetadata")
+        return (usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0)) if usage else None
+    try:
+        usage = result.usage_metadata
+    except Exception:
+        return None  # an SDK stream that never completed has no usage yet
+    if not usage:
+        return None
+    return usage.prompt_token_count or 0, usage.candidates_token_count or 0
+
+
+def _json_body(resp):
+    """The decoded body, or an error body in the API's shape when it is not JSON (e.g. a proxy's HTML 502)."""
+    try:
+        body = resp.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict):
+        if resp.status_code != 200 and "error" not in body:
+            body = {**body, "error": {"code": resp.status_code, "message": f"HTTP {resp.status_code}"}}
+        return body
+    return {"error": {"code": resp.status_code, "message": f"HTTP {resp.status_code}: {resp.text[:200]}"}}
+
+
+class _RetryableHTTPError(Exception):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+        self.code = response.status_code
+
+
+def _is_retryable(exc):
+    if isinstance(exc, (DeadlineExceeded, requests.ReadTimeout)):
+        return False  # our own timeout ran out: another attempt would only wait it out again
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, RetryError)):
+        return True
+    if isinstance(exc, (GoogleAPICallError, _RetryableHTTPError)):
+        return getattr(exc, "code", None) in RETRYABLE_STATUS
+    return False
+
+
+def _is_quota(exc):
+    return getattr(exc, "code", None) == 429
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return None
+    # gRPC quota errors carry a google.rpc.RetryInfo detail instead of a header
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ────────────────────────────────────────────────
+#  Background jobs (SQLite store + worker pool)
+# ────────────────────────────────────────────────
+JOBS_DB = "jobs.db"
+DEFAULT_WORKERS = 4
+STALE_AFTER = 600
+PROGRESS_INTERVAL = 0.25
+ACTIVE = ("queued", "running")
+
+
+def job_key(kind, params):
+    payload = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class JobStore:
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " dedupe_key TEXT NOT NULL,"
+                " user TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " params TEXT,"
+                " progress TEXT,"
+                " result TEXT,"
+                " error TEXT,"
+                " error_type TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (dedupe_key, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind, key, user, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, user, status, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, key, user, json.dumps(params, default=str), now, now)
+            )
+        return job_id
+
+    def find_active(self, key, max_age=STALE_AFTER):
+        """Newest queued or running job for ``key``; one silent for ``max_age`` seconds is presumed dead."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) AND updated_at >= ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (key, *ACTIVE, time.time() - max_age)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        for name in ("progress", "result"):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _decode(row) if row else None
+
+    def recent(self, user, limit=10):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE user = ? ORDER BY created_at DESC LIMIT ?", (user, limit)
+            ).fetchall()
+        return [_decode(r) for r in rows]
+
+    def expire_stale(self, max_age=STALE_AFTER):
+        """Fail jobs whose worker stopped heart-beating (e.g. the server restarted mid-job)."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted (server restarted)', updated_at = ? "
+                "WHERE status IN (?, ?) AND updated_at < ?",
+                (time.time(), *ACTIVE, time.time() - max_age)
+            )
+
+
+def is_active(job, max_age=STALE_AFTER):
+    """Still queued or running, and heard from within ``max_age`` seconds."""
+    return job is not None and job["status"] in ACTIVE and time.time() - job["updated_at"] < max_age
+
+
+def _decode(row):
+    job = dict(row)
+    for name in ("params", "progress", "result"):
+        if job[name] is not None:
+            job[name] = json.loads(job[name])
+    return job
+
+
+class JobHandle:
+    """Passed to a job function so it can publish partial progress."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.id = job_id
+        self._last = 0.0
+
+    def progress(self, data, force=False):
+        now = time.monotonic()
+        if force or now - self._last >= PROGRESS_INTERVAL:
+            self.store.update(self.id, progress=data)
+            self._last = now
+
+
+class JobQueue:
+    def __init__(self, store, workers=DEFAULT_WORKERS):
+        self.store = store
+        self.store.expire_stale()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+
+    def submit(self, kind, user, params, fn, key=None):
+        """Queue ``fn(handle)``; an identical job already queued or running is reused instead."""
+        key = key or job_key(kind, params)
+        with self._lock:
+            existing = self.store.find_active(key)
+            if existing:
+                return existing
+            job_id = self.store.create(kind, key, user, params)
+        self._executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def _run(self, job_id, fn):
+        # Store writes are inside the try too: a locked database or an unserialisable result must still
+        # leave the job failed, not running forever
+        try:
+            self.store.update(job_id, status="running")
+            result = fn(JobHandle(self.store, job_id))
+            self.store.update(job_id, status="done", result=result)
+        except Exception as e:
+            self._fail(job_id, e)
+
+    def _fail(self, job_id, error, attempts=3):
+        for attempt in range(attempts):
+            try:
+                self.store.update(job_id, status="failed", error=str(error), error_type=type(error).__name__)
+                return
+            except sqlite3.Error:
+                time.sleep(1 + attempt)
+        # Still unwritable: find_active stops reusing the job once it goes stale
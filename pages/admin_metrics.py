@@ -0,0 +1,80 @@
+import time
+
+import streamlit as st
+
+from telemetry import admin_users, shared_telemetry
+
+# ────────────────────────────────────────────────
+#  Admin: Gemini latency, tokens and cost
+# ────────────────────────────────────────────────
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 24 * 3600, "Last 7 days": 7 * 24 * 3600}
+
+if not st.session_state.get("logged_in") or st.session_state.get("username") not in admin_users():
+    st.error("Admins only. Ask an operator to add you to CURRICUFORGE_ADMINS.")
+    st.stop()
+
+st.title("📈 Gemini metrics")
+
+telemetry = shared_telemetry()
+window_label = st.radio("Window", list(WINDOWS), horizontal=True)
+since = time.time() - WINDOWS[window_label]
+
+
+def table(rows, keys):
+    return [
+        {
+            **{k: row[k] or "—" for k in keys},
+            "calls": row["calls"],
+            "errors": row["errors"],
+            "retries": row["retries"],
+            "cache hits": row["cache_hits"],
+            "p50 s": round(row["p50"], 2),
+            "p95 s": round(row["p95"], 2),
+            "p99 s": round(row["p99"], 2),
+            "first token p50 s": round(row["ttft_p50"], 2),
+            "tokens in": row["prompt_tokens"],
+            "tokens out": row["output_tokens"],
+            "cost $": round(row["cost"], 4)
+        }
+        for row in rows
+    ]
+
+
+totals = telemetry.summary(since, by=())
+if not totals:
+    st.info("No Gemini calls recorded in this window yet.")
+    st.stop()
+total = totals[0]
+
+col1, col2, col3, col4, col5 = st.columns(5)
+col1.metric("Calls", total["calls"])
+col2.metric("Error rate", f"{total['errors'] / total['calls']:.1%}" if total["calls"] else "—")
+col3.metric("p95 latency", f"{total['p95']:.2f}s")
+col4.metric("Cache hits", total["cache_hits"])
+col5.metric("Est. cost", f"${total['cost']:.4f}")
+
+st.subheader("By model")
+st.dataframe(table(telemetry.summary(since, by=("model",)), ["model"]), use_container_width=True)
+
+st.subheader("By user")
+st.dataframe(table(telemetry.summary(since, by=("user",)), ["user"]), use_container_width=True)
+
+with st.expander("By user and model"):
+    st.dataframe(table(telemetry.summary(since, by=("user", "model")), ["user", "model"]),
+                 use_container_width=True)
+
+errors = telemetry.errors(since)
+if errors:
+    st.subheader("Recent errors")
+    st.dataframe([
+        {"when": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["ts"])), "user": r["user"] or "—",
+         "call": r["kind"], "model": r["model"], "error": r["error"], "retries": r["retries"],
+         "latency s": round(r["latency"], 2)}
+        for r in errors
+    ], use_container_width=True)
+
+with st.expander("Prometheus export"):
+    export = telemetry.prometheus(WINDOWS[window_label])
+    st.code(export, language="text")
+    st.download_button("Download metrics.prom", export, "metrics.prom", "text/plain")
+    st.caption("Set CURRICUFORGE_METRICS_PORT to serve the last hour at /metrics for a scraper.")
@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import time
+from functools import lru_cache
+
+# ────────────────────────────────────────────────
+#  Password hashing (scrypt / PBKDF2, self-describing)
+# ────────────────────────────────────────────────
+# Stored formats:
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#   <64 hex chars>                       legacy unsalted SHA-256
+SCRYPT_PARAMS = {
+    "n": int(os.environ.get("CURRICUFORGE_SCRYPT_N", 2 ** 14)),
+    "r": int(os.environ.get("CURRICUFORGE_SCRYPT_R", 8)),
+    "p": int(os.environ.get("CURRICUFORGE_SCRYPT_P", 1))
+}
+PBKDF2_ITERATIONS = int(os.environ.get("CURRICUFORGE_PBKDF2_ITERATIONS", 600_000))
+SALT_BYTES = 16
+KEY_BYTES = 32
+CALIBRATION_SAMPLES = 5
+CALIBRATION_HEADROOM = 0.75     # median must fit in this share of the budget, leaving room for the tail
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # OpenSSL rejects the call unless maxmem covers the 128 * n * r working set
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 2 ** 20, dklen=KEY_BYTES)
+
+
+def hash_password(password, scheme="scrypt", **params):
+    salt = os.urandom(SALT_BYTES)
+    if scheme == "scrypt":
+        cost = {**SCRYPT_PARAMS, **params}
+        key = _scrypt(password, salt, cost["n"], cost["r"], cost["p"])
+        return f"scrypt${cost['n']}${cost['r']}${cost['p']}${_b64(salt)}${_b64(key)}"
+    if scheme == "pbkdf2_sha256":
+        iterations = params.get("iterations", PBKDF2_ITERATIONS)
+        key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=KEY_BYTES)
+        return f"pbkdf2_sha256${iterations}${_b64(salt)}${_b64(key)}"
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+
+def is_legacy(stored):
+    return "$" not in stored and len(stored) == 64
+
+
+@lru_cache(maxsize=None)
+def _dummy_hash():
+    return hash_password(_b64(os.urandom(SALT_BYTES)))
+
+
+def verify_password(password, stored):
+    if not stored:
+        # Unknown user: spend the same scrypt work anyway, so response time does not reveal which
+        # usernames exist
+        verify_password(password, _dummy_hash())
+        return False
+    if is_legacy(stored):
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(candidate, stored)
+
+    scheme, _, rest = stored.partition("$")
+    try:
+        if scheme == "scrypt":
+            n, r, p, salt, key = rest.split("$")
+            candidate = _scrypt(password, _unb64(salt), int(n), int(r), int(p))
+        elif scheme == "pbkdf2_sha256":
+            iterations, salt, key = rest.split("$")
+            candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), _unb64(salt), int(iterations),
+                                            dklen=KEY_BYTES)
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(candidate, _unb64(key))
+
+
+def needs_rehash(stored):
+    """True for legacy SHA-256 entries and hashes made with weaker-than-current parameters."""
+    if is_legacy(stored):
+        return True
+    scheme, _, rest = stored.partition("$")
+    if scheme != "scrypt":
+        return True
+    n, r, p = (int(v) for v in rest.split("$")[:3])
+    return (n, r, p) != (SCRYPT_PARAMS["n"], SCRYPT_PARAMS["r"], SCRYPT_PARAMS["p"])
+
+
+@lru_cache(maxsize=None)
+def calibrate_scrypt(budget_ms=250, r=8, p=1, samples=CALIBRATION_SAMPLES):
+    """Largest power-of-two scrypt ``n`` whose hash stays under ``budget_ms`` on this machine.
+
+    One timing is too noisy to size a login on, so each ``n`` is judged by the median of ``samples``
+    runs, which must fit within CALIBRATION_HEADROOM of the budget.
+    """
+    best = 2 ** 12
+    n = best
+    while n <= 2 ** 20:
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            _scrypt("calibration", b"\0" * SALT_BYTES, n, r, p)
+            timings.append((time.perf_counter() - start) * 1000)
+        if statistics.median(timings) > budget_ms * CALIBRATION_HEADROOM:
+            break
+        best = n
+        n *= 2
+    return best
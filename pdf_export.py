@@ -0,0 +1,85 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+# ────────────────────────────────────────────────
+#  Curriculum → PDF (memoized by content hash)
+# ────────────────────────────────────────────────
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def content_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def _styles():
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+
+def generate_pdf(data):
+    # reportlab takes a noticeable slice of cold start, so it loads on the first export only
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = _styles()
+    elements = []
+    elements.append(Paragraph(data.get("program_title", ""), styles["Title"]))
+    elements.append(Spacer(1, 12))
+
+    for sem in data.get("semesters", []):
+        elements.append(Paragraph(f"Semester {sem.get('semester')}", styles["Heading2"]))
+        elements.append(Spacer(1, 10))
+        for course in sem.get("courses", []):
+            elements.append(Paragraph(course.get("course_name", ""), styles["Heading3"]))
+            elements.append(Paragraph(f"Credits: {course.get('credits', '')}", styles["Normal"]))
+            elements.append(Spacer(1, 5))
+            elements.append(Paragraph("Topics:", styles["Normal"]))
+            for t in course.get("topics", []):
+                elements.append(Paragraph(f"- {t}", styles["Normal"]))
+            elements.append(Spacer(1, 5))
+            elements.append(Paragraph("Learning Outcomes:", styles["Normal"]))
+            for o in course.get("learning_outcomes", []):
+                elements.append(Paragraph(f"- {o}", styles["Normal"]))
+            elements.append(Spacer(1, 15))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+class PdfCache:
+    """LRU of rendered PDFs keyed by curriculum content hash, bounded by total bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def peek(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            return None
+
+    def get_or_build(self, data, key=None):
+        key = key or content_hash(data)
+        pdf = self.peek(key)
+        if pdf is not None:
+            return pdf
+        pdf = generate_pdf(data)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = pdf
+                self._size += len(pdf)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+        return pdf
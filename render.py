@@ -0,0 +1,82 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# ────────────────────────────────────────────────
+#  Chat transcript rendering (memoized by message hash)
+# ────────────────────────────────────────────────
+CACHE_SIZE = 1024
+LIVE_MESSAGES = 6
+
+_DOLLAR_RE = re.compile(r"(?<!\\)\$")
+_TABLE_START_RE = re.compile(r"([^\n])\n(\|[^\n]*\|\n\|[ :\-|]+\|)")
+_CODE_RE = re.compile(r"(```.*?```|`[^`\n]*`)", re.DOTALL)
+
+
+class _LRU:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return value
+
+
+_cache = _LRU(CACHE_SIZE)
+
+
+def message_hash(content):
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def _process_prose(text):
+    # Streamlit reads $...$ as LaTeX; curricula mention prices far more often than maths
+    text = _DOLLAR_RE.sub(r"\\$", text)
+    # Markdown tables only render when a blank line separates them from the paragraph above
+    return _TABLE_START_RE.sub(r"\1\n\n\2", text)
+
+
+def format_markdown(content):
+    parts = _CODE_RE.split(content.replace("\r\n", "\n"))
+    # Odd indexes are code spans/blocks captured by the split; leave them untouched
+    return "".join(part if i % 2 else _process_prose(part) for i, part in enumerate(parts))
+
+
+def prepare_markdown(content):
+    return _cache.get_or_compute(("msg", message_hash(content)), lambda: format_markdown(content))
+
+
+def collapsed_block(messages, labels):
+    """One pre-rendered markdown block for a run of older messages."""
+    key = ("block", tuple(message_hash(m["parts"][0]) + m["role"] for m in messages))
+
+    def build():
+        sections = [f"**{labels[m['role']]}:**\n\n{prepare_markdown(m['parts'][0])}" for m in messages]
+        return "\n\n---\n\n".join(sections)
+    return _cache.get_or_compute(key, build)
+
+
+def split_transcript(messages, live=LIVE_MESSAGES):
+    """(older, recent): recent messages get their own chat bubbles, older ones are collapsed."""
+    if len(messages) <= live:
+        return [], list(messages)
+    return messages[:-live], messages[-live:]
+
+
+def cache_stats():
+    return {"hits": _cache.hits, "misses": _cache.misses, "entries": len(_cache._items)}
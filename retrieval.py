@@ -0,0 +1,282 @@
+import atexit
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ────────────────────────────────────────────────
+#  Semantic index over saved curricula and notebook sections
+# ────────────────────────────────────────────────
+INDEX_FILE = "retrieval_index.npz"
+EMBED_MODEL = "gemini-embedding-001"
+EMBED_DIM = 768
+EMBED_BATCH = 100           # batchEmbedContents limit per request
+NEAR_DUPLICATE = 0.90       # similarity at which a saved program is offered instead of generating
+SEED_MIN = 0.75             # similarity at which a saved program is worth passing as a seed
+QUERY_CACHE = 256           # recent query vectors kept, since reruns repeat the same query
+QUERY_FAILURE_TTL = 60      # seconds a failed query embed is remembered instead of re-sent
+SAVE_DELAY = 2.0            # seconds to batch index writes before rewriting the file
+
+
+class GeminiEmbedder:
+    """Embeds texts through GeminiClient.embed; ``name`` is stored with the index to detect a model change."""
+
+    def __init__(self, client, model=EMBED_MODEL, dim=EMBED_DIM):
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.name = f"{model}/{dim}"
+        self._queries = OrderedDict()
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def using(self, client):
+        """This embedder, sharing its query cache, calling through ``client`` (e.g. a ScheduledClient)."""
+        view = copy.copy(self)
+        view.client = client
+        return view
+
+    def __call__(self, texts, query=False):
+        if query and len(texts) == 1:
+            return self._query(texts[0])
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH):
+            vectors += self.client.embed(self.model, texts[i:i + EMBED_BATCH], dim=self.dim,
+                                         task="RETRIEVAL_QUERY" if query else "RETRIEVAL_DOCUMENT")
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+    def _query(self, text):
+        with self._lock:
+            if text in self._queries:
+                self._queries.move_to_end(text)
+                return self._queries[text]
+            if self._failed.get(text, 0) > time.monotonic():
+                raise RuntimeError("Query embedding failed recently; not retrying yet")
+        # Suggestions are optional, so a query gets one attempt: no backoff while someone waits on it
+        try:
+            vector = np.asarray(self.client.embed(self.model, [text], dim=self.dim, task="RETRIEVAL_QUERY",
+                                                  retry=False), dtype=np.float32).reshape(1, self.dim)
+        except Exception:
+            with self._lock:
+                now = time.monotonic()
+                self._failed = {t: until for t, until in self._failed.items() if until > now}
+                self._failed[text] = now + QUERY_FAILURE_TTL
+            raise
+        with self._lock:
+            self._queries[text] = vector
+            while len(self._queries) > QUERY_CACHE:
+                self._queries.popitem(last=False)
+        return vector
+
+
+class HashingEmbedder:
+    """Offline fallback: signed feature hashing of words and word pairs. Lexical, but free and instant."""
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.name = f"hashing/{dim}"
+
+    def __call__(self, texts, query=False):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"[a-z0-9]+", text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                matrix[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        return matrix
+
+
+# ── documents ───────────────────────────────────
+def curriculum_text(spec, data):
+    """What a program is about, for embedding: spec, title and course names (topics would drown the signal)."""
+    spec = spec or {}
+    lines = [data.get("program_title", ""),
+             f"{spec.get('skill', '')} · {spec.get('level', '')} · {spec.get('industry', '')}"]
+    for sem in data.get("semesters", []):
+        lines.append("; ".join(c.get("course_name", "") for c in sem.get("courses", []) if isinstance(c, dict)))
+    return "\n".join(line for line in lines if line.strip(" ·"))
+
+
+def compact_seed(data):
+    """A token-cheap outline of a saved program to hand the model as a starting point."""
+    lines = [f"Program: {data.get('program_title', '')}"]
+    for sem in data.get("semesters", []):
+        names = ", ".join(c.get("course_name", "") for c in sem.get("courses", []) if isinstance(c, dict))
+        lines.append(f"Semester {sem.get('semester')}: {names}")
+    return "\n".join(lines)
+
+
+def notebook_sections(content):
+    """Split notebook markdown at headings; each non-trivial section becomes one document."""
+    sections = re.split(r"\n(?=#{1,3} )", "\n" + (content or ""))
+    return [s.strip() for s in sections if len(s.strip()) > 40]
+
+
+def spec_query(spec):
+    return f"{spec['skill']} · {spec['level']} · {spec['industry']}\n{spec['semesters']} semesters"
+
+
+# ── index ───────────────────────────────────────
+class RetrievalIndex:
+    """Unit vectors in one NumPy matrix; search is a single matrix-vector product plus top-k.
+
+    Rows are appended into spare capacity, so adding a document never re-embeds or copies the rest.
+    Changes are written to disk by a timer thread, batched over SAVE_DELAY seconds.
+    """
+
+    def __init__(self, path=INDEX_FILE, embedder_name=None):
+        self.path = path
+        self.embedder_name = embedder_name
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        self._matrix = None
+        self._size = 0
+        self.docs = []
+        self._ids = {}
+        if os.path.exists(path):
+            self._load()
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return self._size
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            if str(data["embedder"]) != self.embedder_name:
+                return  # embedded by another model: start over rather than mix vector spaces
+            self._matrix = data["vectors"].astype(np.float32)
+            self.docs = json.loads(str(data["docs"]))
+        self._size = len(self.docs)
+        self._ids = {doc["id"]: i for i, doc in enumerate(self.docs)}
+
+    def save(self):
+        with self._lock:
+            vectors = self._matrix[:self._size] if self._matrix is not None else np.zeros((0, 0), np.float32)
+            docs = json.dumps(self.docs)
+        tmp = f"{self.path}.tmp.npz"
+        with self._save_lock:
+            np.savez(tmp, vectors=vectors, docs=np.array(docs), embedder=np.array(self.embedder_name or ""))
+            os.replace(tmp, self.path)
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes now (the save timer, and exit, call this)."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            dirty, self._dirty = self._dirty, False
+        if dirty:
+            self.save()
+
+    def __contains__(self, doc_id):
+        return doc_id in self._ids
+
+    def add(self, docs, embed):
+        """Embed and append ``docs`` (dicts with ``id`` and ``text``) that are not indexed yet."""
+        docs = [d for d in docs if d["id"] not in self._ids]
+        if not docs:
+            return 0
+        vectors = embed([d["text"] for d in docs])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            # Another thread may have indexed some of these while we were embedding
+            fresh = [i for i, d in enumerate(docs) if d["id"] not in self._ids]
+            needed = self._size + len(fresh)
+            if self._matrix is None or needed > len(self._matrix):
+                grown = np.zeros((max(needed, 2 * self._size, 64), vectors.shape[1]), dtype=np.float32)
+                if self._matrix is not None:
+                    grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            self._matrix[self._size:needed] = vectors[fresh]
+            for i in fresh:
+                doc = docs[i]
+                self._ids[doc["id"]] = len(self.docs)
+                self.docs.append({k: v for k, v in doc.items() if k != "text"} | {"snippet": doc["text"][:200]})
+            self._size = needed
+        self._schedule_save()
+        return len(fresh)
+
+    def remove(self, doc_ids):
+        doc_ids = set(doc_ids) & set(self._ids)
+        if not doc_ids:
+            return
+        with self._lock:
+            keep = [i for i, doc in enumerate(self.docs) if doc["id"] not in doc_ids]
+            self._matrix = self._matrix[keep] if keep else None
+            self.docs = [self.docs[i] for i in keep]
+            self._size = len(self.docs)
+            self._ids = {doc["id"]: i for i, doc in enumerate(self.docs)}
+        self._schedule_save()
+
+    def search(self, query, embed, k=5, kind=None, user=None, min_score=0.0):
+        """Top-``k`` documents by cosine similarity; ``user`` limits private kinds (notes) to their owner."""
+        with self._lock:
+            if not self._size:
+                return []
+            matrix = self._matrix[:self._size]
+            docs = list(self.docs)
+        vector = embed([query], query=True)[0]
+        vector = vector / (np.linalg.norm(vector) or 1)
+        scores = matrix @ vector
+        # Saved programs are shared across the shop; notebook sections stay private to their owner
+        mask = np.array([(kind is None or d["kind"] == kind) and (d["kind"] == "curriculum" or d.get("user") == user)
+                         for d in docs])
+        scores = np.where(mask, scores, -np.inf)
+        # Over-fetch so identical copies (the same program saved by several users) collapse to one hit
+        wanted = min(k * 4, len(scores))
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        results, seen = [], set()
+        for i in top[np.argsort(-scores[top])]:
+            if scores[i] < min_score or len(results) == k:
+                break
+            if docs[i]["snippet"] not in seen:
+                seen.add(docs[i]["snippet"])
+                results.append({**docs[i], "score": float(scores[i])})
+        return results
+
+    # ── sources ─────────────────────────────────
+    def sync_curricula(self, workspace, embed):
+        """Index every saved curriculum newer than the last one indexed."""
+        last = max((d["ref"] for d in self.docs if d["kind"] == "curriculum"), default=0)
+        added = 0
+        while True:
+            rows = workspace.curricula_after(last)
+            if not rows:
+                return added
+            added += self.add([
+                {"id": f"curriculum:{r['id']}", "kind": "curriculum", "ref": r["id"], "user": r["user"],
+                 "title": r["program_title"], "text": curriculum_text(r["spec"], r["data"])}
+                for r in rows
+            ], embed)
+            last = rows[-1]["id"]
+
+    def sync_notebook(self, user, content, embed):
+        """Re-index one user's notebook: new sections are embedded, deleted ones dropped."""
+        sections = {f"note:{user}:{hashlib.sha1(s.encode()).hexdigest()[:16]}": s
+                    for s in notebook_sections(content)}
+        stale = [d["id"] for d in self.docs if d["kind"] == "note" and d.get("user") == user
+                 and d["id"] not in sections]
+        self.remove(stale)
+        return self.add([
+            {"id": doc_id, "kind": "note", "user": user, "title": text.splitlines()[0].lstrip("# ")[:80],
+             "text": text}
+            for doc_id, text in sections.items()
+        ], embed)
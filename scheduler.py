@@ -0,0 +1,224 @@
+import itertools
+import threading
+import time
+
+from google.api_core.exceptions import ResourceExhausted
+
+from gemini_client import without_quota_retries
+from telemetry import tagged
+
+# ────────────────────────────────────────────────
+#  Quota-aware request scheduler
+# ────────────────────────────────────────────────
+# Requests per minute; defaults follow the Gemini free tier
+MODEL_LIMITS = {
+    "gemini-2.5-pro": 5,
+    "gemini-2.5-flash": 10,
+    "gemini-2.5-flash-lite": 15,
+    "gemini-embedding-001": 100
+}
+FALLBACK_ORDER = ["gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite"]
+USER_RPM = 6
+COOLDOWN = 60
+MAX_WAIT = 60
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NOTEBOOK = 1
+PRIORITY_GENERATION = 2
+PRIORITY_BATCH = 3
+
+
+class QueueTimeout(ResourceExhausted):
+    """Raised when a request waited longer than ``max_wait`` for quota."""
+
+
+def is_quota_error(exc):
+    return isinstance(exc, ResourceExhausted) or getattr(exc, "code", None) == 429
+
+
+def fallback_chain(model_name):
+    if model_name not in FALLBACK_ORDER:
+        return [model_name]
+    return FALLBACK_ORDER[FALLBACK_ORDER.index(model_name):]
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        self._refill()
+        return self.tokens >= 1
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def remaining(self):
+        self._refill()
+        return int(self.tokens)
+
+
+class Scheduler:
+    """Admits Gemini calls in priority order under per-user and per-model token buckets.
+
+    When the requested model has no local budget, or upstream answers 429, the call falls back to the
+    next cheaper model in FALLBACK_ORDER.
+    """
+
+    def __init__(self, model_limits=None, user_rpm=USER_RPM, cooldown=COOLDOWN, max_wait=MAX_WAIT):
+        self.user_rpm = user_rpm
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = {}
+        self._models = {m: TokenBucket(rpm) for m, rpm in (model_limits or MODEL_LIMITS).items()}
+        self._users = {}
+        self._cooling = {}
+        self._served = 0
+        self._fallbacks = 0
+        self._timeouts = 0
+
+    def bind(self, client, user, priority=PRIORITY_GENERATION):
+        return ScheduledClient(self, client, user, priority)
+
+    def run(self, user, model_name, fn, priority=PRIORITY_GENERATION):
+        """Call ``fn(model)`` once admitted; returns ``(result, model_used)``."""
+        excluded = set()
+        while True:
+            chosen = self._acquire(user, model_name, priority, excluded)
+            try:
+                # A 429 comes straight back here to fall back, rather than after the client's backoff
+                with tagged(user=user), without_quota_retries():
+                    return fn(chosen), chosen
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                with self._cond:
+                    self._cooling[chosen] = time.monotonic() + self.cooldown
+                excluded.add(chosen)
+                if all(m in excluded for m in fallback_chain(model_name)):
+                    raise
+
+    # ── admission ───────────────────────────────
+    def _user_bucket(self, user):
+        if user not in self._users:
+            self._users[user] = TokenBucket(self.user_rpm)
+        return self._users[user]
+
+    def _pick_model(self, model_name, excluded):
+        now = time.monotonic()
+        for m in fallback_chain(model_name):
+            if m in excluded or self._cooling.get(m, 0) > now:
+                continue
+            bucket = self._models.get(m)
+            if bucket is None or bucket.available():
+                return m
+        return None
+
+    def _acquire(self, user, model_name, priority, excluded):
+        ticket = next(self._seq)
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            self._waiting[ticket] = (priority, ticket, user, model_name, excluded)
+            try:
+                while True:
+                    # Serve the highest-priority waiter that can run now, so one throttled user
+                    # never blocks everyone queued behind them
+                    for _, t, u, m, ex in sorted(self._waiting.values(), key=lambda w: w[:2]):
+                        if not self._user_bucket(u).available():
+                            continue
+                        chosen = self._pick_model(m, ex)
+                        if chosen is None:
+                            continue
+                        if t == ticket:
+                            self._user_bucket(user).take()
+                            if chosen in self._models:
+                                self._models[chosen].take()
+                            self._served += 1
+                            if chosen != model_name:
+                                self._fallbacks += 1
+                            return chosen
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise QueueTimeout(f"No Gemini quota available for {model_name} after {self.max_wait}s")
+                    self._cond.wait(min(remaining, self._next_refill()))
+            finally:
+                del self._waiting[ticket]
+                self._cond.notify_all()
+
+    def _next_refill(self):
+        waits = [b.wait_time() for b in itertools.chain(self._models.values(), self._users.values())]
+        waits = [w for w in waits if w > 0]
+        return min(waits + [1.0])
+
+    # ── stats ───────────────────────────────────
+    def stats(self, user=None):
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "queue_depth": len(self._waiting),
+                "served": self._served,
+                "fallbacks": self._fallbacks,
+                "timeouts": self._timeouts,
+                "models": {
+                    m: {"remaining": b.remaining(), "cooling": self._cooling.get(m, 0) > now}
+                    for m, b in self._models.items()
+                },
+                "user_remaining": self._user_bucket(user).remaining() if user is not None else None
+            }
+
+
+class ScheduledClient:
+    """Drop-in for GeminiClient's one-shot calls that routes them through a Scheduler."""
+
+    def __init__(self, scheduler, client, user, priority):
+        self.scheduler = scheduler
+        self.client = client
+        self.user = user
+        self.priority = priority
+        self.last_model = None
+        self.models_used = set()
+
+    def _run(self, model_name, fn):
+        result, self.last_model = self.scheduler.run(self.user, model_name, fn, self.priority)
+        # Multi-call generations (fan-out, repairs) may fall back on any one call, not just the last
+        self.models_used.add(self.last_model)
+        return result
+
+    def generate_content(self, model_name, prompt, **kwargs):
+        return self._run(model_name, lambda m: self.client.generate_content(m, prompt, **kwargs))
+
+    def post_generate(self, model_name, payload):
+        def attempt(m):
+            result = self.client.post_generate(m, payload)
+            if result.get("error", {}).get("code") == 429:
+                raise ResourceExhausted(result["error"].get("message", "Quota exceeded"))
+            return result
+        return self._run(model_name, attempt)
+
+    def embed(self, model_name, texts, **kwargs):
+        return self._run(model_name, lambda m: self.client.embed(m, texts, **kwargs))
+
+    def stream_generate(self, model_name, payload):
+        def attempt(m):
+            # Pull the first piece inside the scheduler so a 429 on open can still fall back
+            stream = self.client.stream_generate(m, payload)
+            first = next(stream, None)
+            return itertools.chain([] if first is None else [first], stream)
+        yield from self._run(model_name, attempt)
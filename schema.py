@@ -0,0 +1,127 @@
+from typing import TypedDict, get_args, get_origin, get_type_hints
+
+# ────────────────────────────────────────────────
+#  Curriculum shape (single source for Gemini's responseSchema and validation)
+# ────────────────────────────────────────────────
+class Course(TypedDict):
+    course_name: str
+    credits: str
+    topics: list[str]
+    learning_outcomes: list[str]
+
+
+class Semester(TypedDict):
+    semester: int
+    courses: list[Course]
+
+
+class Curriculum(TypedDict):
+    program_title: str
+    semesters: list[Semester]
+
+
+class SemesterPlan(TypedDict):
+    semester: int
+    theme: str
+    course_names: list[str]
+
+
+class Skeleton(TypedDict):
+    program_title: str
+    semesters: list[SemesterPlan]
+
+
+_GEMINI_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+
+def response_schema(tp):
+    """The OpenAPI-subset schema Gemini expects in ``generationConfig.responseSchema``."""
+    if get_origin(tp) is list:
+        return {"type": "ARRAY", "items": response_schema(get_args(tp)[0])}
+    if tp in _GEMINI_TYPES:
+        return {"type": _GEMINI_TYPES[tp]}
+    hints = get_type_hints(tp)
+    return {
+        "type": "OBJECT",
+        "properties": {name: response_schema(hint) for name, hint in hints.items()},
+        "required": list(hints)
+    }
+
+
+COURSE_SCHEMA = response_schema(Course)
+SEMESTER_SCHEMA = response_schema(Semester)
+CURRICULUM_SCHEMA = response_schema(Curriculum)
+SKELETON_SCHEMA = response_schema(Skeleton)
+
+
+# ────────────────────────────────────────────────
+#  Validation
+# ────────────────────────────────────────────────
+# Problems are (path, message) pairs, e.g. (("semesters", 2, "courses", 0, "topics"), "is empty"),
+# so a caller can re-request just the object at fault.
+
+def _text(value):
+    return isinstance(value, str) and value.strip() != ""
+
+
+def _text_list(value):
+    if not isinstance(value, list):
+        return "is missing"
+    if not value:
+        return "is empty"
+    if not all(_text(item) for item in value):
+        return "has blank entries"
+    return None
+
+
+def validate_course(course, path=()):
+    if not isinstance(course, dict):
+        return [(path, "is not an object")]
+    problems = []
+    if not _text(course.get("course_name")):
+        problems.append((path + ("course_name",), "is missing"))
+    credits = course.get("credits")
+    if not (_text(credits) or (isinstance(credits, (int, float)) and not isinstance(credits, bool))):
+        problems.append((path + ("credits",), "is missing"))
+    for name in ("topics", "learning_outcomes"):
+        message = _text_list(course.get(name))
+        if message:
+            problems.append((path + (name,), message))
+    return problems
+
+
+def validate_semester(semester, path=()):
+    if not isinstance(semester, dict):
+        return [(path, "is not an object")]
+    problems = []
+    try:
+        if int(semester.get("semester")) < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        problems.append((path + ("semester",), "is not a semester number"))
+    courses = semester.get("courses")
+    if not isinstance(courses, list) or not courses:
+        problems.append((path + ("courses",), "has no courses"))
+        return problems
+    for i, course in enumerate(courses):
+        problems.extend(validate_course(course, path + ("courses", i)))
+    return problems
+
+
+def validate_curriculum(curriculum):
+    if not isinstance(curriculum, dict):
+        return [((), "is not an object")]
+    problems = []
+    if not _text(curriculum.get("program_title")):
+        problems.append((("program_title",), "is missing"))
+    semesters = curriculum.get("semesters")
+    if not isinstance(semesters, list):
+        problems.append((("semesters",), "is missing"))
+        return problems
+    for i, semester in enumerate(semesters):
+        problems.extend(validate_semester(semester, ("semesters", i)))
+    return problems
+
+
+def describe(problems):
+    return "; ".join(f"{'.'.join(str(p) for p in path) or 'response'} {message}" for path, message in problems)
@@ -0,0 +1,169 @@
+import json
+import sqlite3
+import time
+
+# ────────────────────────────────────────────────
+#  Per-user workspace: conversations, notebooks, curricula
+# ────────────────────────────────────────────────
+WORKSPACE_DB = "workspace.db"
+DEFAULT_TITLE = "New conversation"
+
+
+class WorkspaceStore:
+    def __init__(self, path=WORKSPACE_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " id INTEGER PRIMARY KEY,"
+                " user TEXT NOT NULL,"
+                " title TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user, updated_at);"
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " conversation_id INTEGER NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " role TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " meta TEXT,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (conversation_id, seq));"
+                "CREATE TABLE IF NOT EXISTS notebooks ("
+                " user TEXT PRIMARY KEY,"
+                " content TEXT NOT NULL,"
+                " updated_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS curricula ("
+                " id INTEGER PRIMARY KEY,"
+                " user TEXT NOT NULL,"
+                " program_title TEXT NOT NULL,"
+                " spec TEXT,"
+                " data TEXT NOT NULL,"
+                " created_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS idx_curricula_user ON curricula (user, created_at);"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ── conversations ───────────────────────────
+    def create_conversation(self, user, title=DEFAULT_TITLE):
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO conversations (user, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (user, title, now, now)
+            )
+            return cur.lastrowid
+
+    def rename_conversation(self, conversation_id, title):
+        with self._connect() as conn:
+            conn.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
+
+    def list_conversations(self, user, limit=20, offset=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, title, updated_at FROM conversations WHERE user = ? "
+                "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (user, limit, offset)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def append_message(self, conversation_id, role, content, meta=None):
+        now = time.time()
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE serialises writers so two tabs never claim the same seq
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO messages (conversation_id, seq, role, content, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, seq, role, content, json.dumps(meta) if meta else None, now)
+            )
+            conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
+        return seq
+
+    def load_messages(self, conversation_id, before_seq=None, limit=None):
+        """The ``limit`` most recent messages (older than ``before_seq``), oldest first."""
+        query = "SELECT seq, role, content, meta FROM messages WHERE conversation_id = ?"
+        args = [conversation_id]
+        if before_seq is not None:
+            query += " AND seq < ?"
+            args.append(before_seq)
+        query += " ORDER BY seq DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        messages = []
+        for r in reversed(rows):
+            msg = json.loads(r["meta"]) if r["meta"] else {}
+            msg.update({"role": r["role"], "parts": [r["content"]], "seq": r["seq"]})
+            messages.append(msg)
+        return messages
+
+    # ── notebooks ───────────────────────────────
+    def load_notebook(self, user):
+        with self._connect() as conn:
+            row = conn.execute("SELECT content FROM notebooks WHERE user = ?", (user,)).fetchone()
+        return row["content"] if row else None
+
+    def save_notebook(self, user, content):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO notebooks (user, content, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user) DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at",
+                (user, content, time.time())
+            )
+
+    def append_notebook(self, user, text, default=""):
+        """Append to a user's notebook in one transaction, so a worker never overwrites a concurrent save."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT content FROM notebooks WHERE user = ?", (user,)).fetchone()
+            content = (row["content"] if row else default) + text
+            conn.execute(
+                "INSERT INTO notebooks (user, content, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user) DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at",
+                (user, content, time.time())
+            )
+        return content
+
+    # ── curricula ───────────────────────────────
+    def save_curriculum(self, user, data, spec=None):
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO curricula (user, program_title, spec, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user, data.get("program_title", ""), json.dumps(spec) if spec else None, json.dumps(data),
+                 time.time())
+            )
+            return cur.lastrowid
+
+    def list_curricula(self, user, limit=10, offset=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, program_title, spec, created_at FROM curricula WHERE user = ? "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (user, limit, offset)
+            ).fetchall()
+        return [{**dict(r), "spec": json.loads(r["spec"]) if r["spec"] else None} for r in rows]
+
+    def curricula_after(self, after_id, limit=100):
+        """Every user's curricula with id above ``after_id``, oldest first (for incremental indexing)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, user, program_title, spec, data FROM curricula WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+        return [{**dict(r), "spec": json.loads(r["spec"]) if r["spec"] else None, "data": json.loads(r["data"])}
+                for r in rows]
+
+    def load_curriculum(self, curriculum_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM curricula WHERE id = ?", (curriculum_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
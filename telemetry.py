@@ -0,0 +1,250 @@
+"""Per-call telemetry for Gemini traffic: a rolling SQLite store plus a Prometheus text export.
+
+Usage:
+    python telemetry.py                 # print the Prometheus export for the last hour
+    python telemetry.py --window 86400
+"""
+import argparse
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ────────────────────────────────────────────────
+#  Settings
+# ────────────────────────────────────────────────
+TELEMETRY_DB = "telemetry.db"
+RETENTION = 7 * 24 * 3600
+FLUSH_INTERVAL = 2.0
+PRUNE_EVERY = 100           # flushes between retention sweeps
+PROMETHEUS_WINDOW = 3600
+
+# USD per 1M tokens (input, output), paid-tier list prices; override for your own contract
+PRICES = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40)
+}
+
+_labels = ContextVar("telemetry_labels", default={})
+
+
+def admin_users():
+    return {name.strip() for name in os.environ.get("CURRICUFORGE_ADMINS", "").split(",") if name.strip()}
+
+
+@contextmanager
+def tagged(**labels):
+    """Attribute every call made inside the block (e.g. to a user) without threading it through."""
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels():
+    return _labels.get()
+
+
+def cost(model, prompt_tokens, output_tokens):
+    price_in, price_out = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` in any order; 0.0 when empty."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+# ────────────────────────────────────────────────
+#  Store
+# ────────────────────────────────────────────────
+class Telemetry:
+    """Buffers call records in memory and writes them to SQLite in batches off the request path."""
+
+    def __init__(self, path=TELEMETRY_DB, retention=RETENTION, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.retention = retention
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flushes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS calls ("
+                " ts REAL NOT NULL,"
+                " user TEXT,"
+                " kind TEXT NOT NULL,"
+                " model TEXT,"
+                " latency REAL NOT NULL,"
+                " ttft REAL,"
+                " prompt_tokens INTEGER NOT NULL DEFAULT 0,"
+                " output_tokens INTEGER NOT NULL DEFAULT 0,"
+                " retries INTEGER NOT NULL DEFAULT 0,"
+                " error TEXT,"
+                " cached INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_ts ON calls (ts)")
+        threading.Thread(target=self._flush_loop, args=(flush_interval,), daemon=True,
+                         name="telemetry-flush").start()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ── writing ─────────────────────────────────
+    def record(self, kind, model=None, latency=0.0, ttft=None, prompt_tokens=0, output_tokens=0, retries=0,
+               error=None, cached=False, user=None):
+        row = (time.time(), user or current_labels().get("user"), kind, model, latency, ttft,
+               prompt_tokens or 0, output_tokens or 0, retries, error, int(cached))
+        with self._lock:
+            self._buffer.append(row)
+
+    def cache_hit(self, model, user=None):
+        self.record("cache", model, cached=True, user=user)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._flushes += 1
+            prune = self._flushes % PRUNE_EVERY == 0
+        if not rows and not prune:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO calls (ts, user, kind, model, latency, ttft, prompt_tokens, output_tokens, retries, "
+                "error, cached) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            if prune:
+                conn.execute("DELETE FROM calls WHERE ts < ?", (time.time() - self.retention,))
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # a locked database just means this batch waits for the next tick
+
+    # ── reading ─────────────────────────────────
+    def rows(self, since):
+        self.flush()
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute("SELECT * FROM calls WHERE ts >= ? ORDER BY ts", (since,))]
+
+    def summary(self, since, by=("model",)):
+        """Aggregates per group (e.g. ``("user", "model")``) of calls since ``since``."""
+        groups = {}
+        for r in self.rows(since):
+            groups.setdefault(tuple(r[name] for name in by), []).append(r)
+        result = []
+        for key, rows in groups.items():
+            calls = [r for r in rows if not r["cached"]]
+            latencies = [r["latency"] for r in calls if not r["error"]]
+            ttfts = [r["ttft"] for r in calls if r["ttft"] is not None]
+            prompt_tokens = sum(r["prompt_tokens"] for r in calls)
+            output_tokens = sum(r["output_tokens"] for r in calls)
+            result.append({
+                **dict(zip(by, key)),
+                "calls": len(calls),
+                "errors": sum(1 for r in calls if r["error"]),
+                "retries": sum(r["retries"] for r in calls),
+                "cache_hits": len(rows) - len(calls),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "ttft_p50": percentile(ttfts, 50),
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "cost": sum(cost(r["model"], r["prompt_tokens"], r["output_tokens"]) for r in calls)
+            })
+        return sorted(result, key=lambda s: s["cost"], reverse=True)
+
+    def errors(self, since, limit=20):
+        return [r for r in reversed(self.rows(since)) if r["error"]][:limit]
+
+    def prometheus(self, window=PROMETHEUS_WINDOW):
+        """Prometheus text exposition of the last ``window`` seconds, as gauges labelled by model and user."""
+        stats = self.summary(time.time() - window, by=("model", "user"))
+        lines = []
+
+        def metric(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text} (last {window}s)")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{text}}} {value:g}")
+
+        base = [({"model": s["model"] or "", "user": s["user"] or ""}, s) for s in stats]
+        metric("curricuforge_gemini_calls", "Gemini calls", [(l, s["calls"]) for l, s in base])
+        metric("curricuforge_gemini_errors", "Gemini calls that failed", [(l, s["errors"]) for l, s in base])
+        metric("curricuforge_gemini_retries", "Retried attempts", [(l, s["retries"]) for l, s in base])
+        metric("curricuforge_cache_hits", "Requests answered from the response cache",
+               [(l, s["cache_hits"]) for l, s in base])
+        metric("curricuforge_gemini_tokens", "Tokens by direction",
+               [({**l, "direction": d}, s[f"{d}_tokens"]) for l, s in base for d in ("prompt", "output")])
+        metric("curricuforge_gemini_cost_usd", "Estimated spend", [(l, s["cost"]) for l, s in base])
+        metric("curricuforge_gemini_latency_seconds", "Call latency quantiles",
+               [({**l, "quantile": q}, s[f"p{q[2:]}"]) for l, s in base for q in ("0.50", "0.95", "0.99")])
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def shared_telemetry(path=TELEMETRY_DB):
+    """One store per process, shared by the app and its admin page."""
+    return Telemetry(path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ────────────────────────────────────────────────
+#  Scrape endpoint
+# ────────────────────────────────────────────────
+def start_exporter(telemetry, port, host="0.0.0.0"):
+    """Serve ``/metrics`` on a background thread for a Prometheus scraper."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = telemetry.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-exporter").start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=TELEMETRY_DB)
+    parser.add_argument("--window", type=int, default=PROMETHEUS_WINDOW, help="seconds of history to export")
+    args = parser.parse_args()
+    print(Telemetry(args.db).prometheus(args.window), end="")
+
+
+if __name__ == "__main__":
+    main()
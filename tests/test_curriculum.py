@@ -0,0 +1,153 @@
+import json
+
+import pytest
+
+from curriculum import CurriculumStreamParser, generate_fanout, repair_curriculum
+from schema import COURSE_SCHEMA, SEMESTER_SCHEMA
+
+SPEC = {"skill": "Data Engineering", "level": "Beginner", "semesters": 2, "weekly_hours": 10,
+        "industry": "General"}
+
+
+def course(name, **overrides):
+    return {"course_name": name, "credits": "3", "topics": ["Basics"], "learning_outcomes": ["Can do it"],
+            **overrides}
+
+
+def semester(n, *courses):
+    return {"semester": n, "courses": list(courses)}
+
+
+class StubClient:
+    """Answers repair calls with canned JSON per schema; an exception instance is raised instead."""
+
+    def __init__(self, semester=None, course=None):
+        self.replies = {id(SEMESTER_SCHEMA): semester, id(COURSE_SCHEMA): course}
+        self.calls = []
+
+    def post_generate(self, model_name, payload):
+        schema = payload["generationConfig"]["responseSchema"]
+        self.calls.append(schema)
+        reply = self.replies[id(schema)]
+        if isinstance(reply, Exception):
+            raise reply
+        return {"candidates": [{"content": {"parts": [{"text": json.dumps(reply)}]}}]}
+
+
+# ── CurriculumStreamParser ──────────────────────
+def test_parser_emits_each_semester_as_it_closes():
+    text = json.dumps({"program_title": "Data {Eng}", "semesters": [semester(1, course("A")),
+                                                                   semester(2, course("B \"}\""))]})
+    parser = CurriculumStreamParser()
+    emitted = []
+    for i in range(0, len(text), 7):
+        emitted.extend(parser.feed(text[i:i + 7]))
+
+    assert [sem["semester"] for sem in emitted] == [1, 2]
+    assert emitted[1]["courses"][0]["course_name"] == 'B "}"'
+    assert parser.program_title == "Data {Eng}"
+    assert parser.result() == (json.loads(text), True)
+
+
+def test_parser_salvages_closed_semesters_from_a_cut_off_stream():
+    text = json.dumps({"program_title": "P", "semesters": [semester(1, course("A")), semester(2, course("B"))]})
+    parser = CurriculumStreamParser()
+    parser.feed(text[:text.index('{"semester": 2') + 20])
+
+    data, parsed = parser.result()
+    assert not parsed
+    assert data == {"program_title": "P", "semesters": [semester(1, course("A"))]}
+
+
+def test_parser_ignores_objects_outside_the_semesters_array():
+    parser = CurriculumStreamParser()
+    assert parser.feed('{"meta": {"semester": 9}, "semesters": [], "extra": {"semester": 3}}') == []
+    assert parser.semesters == []
+
+
+# ── repair_curriculum ───────────────────────────
+def test_repair_replaces_an_invalid_course_with_a_valid_fix():
+    draft = {"program_title": "P", "semesters": [semester(1, course("A", topics=[])), semester(2, course("B"))]}
+    client = StubClient(course=course("A fixed", credits=4))
+
+    result, repaired = repair_curriculum(client, "m", SPEC, draft)
+
+    assert repaired == 1
+    assert result["semesters"][0]["courses"] == [course("A fixed", credits="4")]
+
+
+def test_repair_keeps_the_draft_when_the_fix_is_not_an_object():
+    draft = {"program_title": "P", "semesters": [semester(1, course("A", topics=[])), semester(2, course("B"))]}
+
+    result, _ = repair_curriculum(StubClient(course=[1, 2]), "m", SPEC, draft)
+
+    assert result["semesters"][0]["courses"] == [course("A", topics=[])]
+
+
+def test_repair_keeps_the_draft_when_the_fix_has_more_problems():
+    draft = {"program_title": "P", "semesters": [semester(1, course("A", topics=[])), semester(2, course("B"))]}
+
+    result, _ = repair_curriculum(StubClient(course={"course_name": "A"}), "m", SPEC, draft)
+
+    assert result["semesters"][0]["courses"] == [course("A", topics=[])]
+
+
+def test_repair_fills_a_missing_semester():
+    draft = {"program_title": "P", "semesters": [semester(1, course("A"))]}
+
+    result, repaired = repair_curriculum(StubClient(semester=semester(2, course("B"))), "m", SPEC, draft)
+
+    assert repaired == 1
+    assert result["semesters"] == [semester(1, course("A")), semester(2, course("B"))]
+
+
+def test_repair_does_not_empty_a_semester_with_a_courseless_fix():
+    draft = {"program_title": "P", "semesters": [semester(1, course("A")), semester(2, course("B"), "junk")]}
+    client = StubClient(semester={"semester": 2, "courses": []}, course=RuntimeError("quota"))
+
+    result, _ = repair_curriculum(client, "m", SPEC, draft)
+
+    assert result["semesters"][1]["courses"] == [course("B")]
+
+
+def test_repair_drops_courses_that_are_not_objects_when_calls_fail():
+    draft = {"program_title": "", "semesters": [semester(1, course("A"), "junk", 7), semester(2, course("B"))]}
+
+    result, repaired = repair_curriculum(StubClient(course=RuntimeError("quota")), "m", SPEC, draft)
+
+    assert repaired == 4  # two bad courses, two rounds
+    assert result["program_title"] == "Data Engineering (Beginner)"
+    assert result["semesters"][0]["courses"] == [course("A")]
+
+
+# ── generate_fanout ─────────────────────────────
+class FanoutClient:
+    """Skeleton first, then one semester per call; semesters listed in ``failing`` raise."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def post_generate(self, model_name, payload):
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        if "Plan the outline" in prompt:
+            reply = {"program_title": "P", "semesters": [{"semester": n, "theme": "", "course_names": [f"C{n}"]}
+                                                         for n in (1, 2)]}
+        else:
+            n = int(prompt.split("Generate semester ")[1].split()[0])
+            if n in self.failing:
+                raise RuntimeError("API Error: overloaded")
+            reply = semester(n, course(f"C{n}"))
+        return {"candidates": [{"content": {"parts": [{"text": json.dumps(reply)}]}}]}
+
+
+def test_fanout_keeps_the_semesters_that_succeeded():
+    done = []
+    result = generate_fanout(FanoutClient(failing={2}), "m", SPEC, on_semester=done.append)
+
+    assert result == {"program_title": "P", "semesters": [semester(1, course("C1"))]}
+    assert done == [semester(1, course("C1"))]
+
+
+def test_fanout_raises_only_when_every_semester_failed():
+    with pytest.raises(RuntimeError, match="overloaded"):
+        generate_fanout(FanoutClient(failing={1, 2}), "m", SPEC)
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import time
+
+from passwords import hash_password
+
+# ────────────────────────────────────────────────
+#  User stores
+# ────────────────────────────────────────────────
+USERS_FILE = "users.json"
+USERS_DB = "users.db"
+
+
+class UserStore:
+    """Maps usernames to password hashes."""
+
+    def get_hash(self, username):
+        raise NotImplementedError
+
+    def add_user(self, username, password_hash):
+        """Create a user; returns False if the name is already taken."""
+        raise NotImplementedError
+
+    def set_hash(self, username, password_hash):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def __contains__(self, username):
+        return self.get_hash(username) is not None
+
+
+class JsonUserStore(UserStore):
+    """The original users.json file. Kept for migration and single-user setups."""
+
+    def __init__(self, path=USERS_FILE):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def _save(self, users):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(users, f, indent=4)
+        os.replace(tmp, self.path)
+
+    def get_hash(self, username):
+        return self.load().get(username)
+
+    def add_user(self, username, password_hash):
+        users = self.load()
+        if username in users:
+            return False
+        users[username] = password_hash
+        self._save(users)
+        return True
+
+    def set_hash(self, username, password_hash):
+        users = self.load()
+        users[username] = password_hash
+        self._save(users)
+
+    def count(self):
+        return len(self.load())
+
+
+class SQLiteUserStore(UserStore):
+    """Indexed, WAL-mode store that is safe to share between Streamlit workers."""
+
+    def __init__(self, path=USERS_DB, legacy_json=USERS_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " username TEXT PRIMARY KEY,"
+                " password_hash TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._migrate(legacy_json)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _migrate(self, legacy_json):
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE makes concurrent first starts agree on a single migration
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                return
+            users = JsonUserStore(legacy_json).load() if legacy_json else {}
+            if not users:
+                users = {"teacher": hash_password("curriculum2025")}
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                [(name, pw_hash, now) for name, pw_hash in users.items()]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)", (str(now),))
+
+    def get_hash(self, username):
+        with self._connect() as conn:
+            row = conn.execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password_hash):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                    (username, password_hash, time.time())
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def set_hash(self, username, password_hash):
+        with self._connect() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]